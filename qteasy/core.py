@@ -716,10 +716,12 @@ def refill_data_source(tables, *, channel=None, data_source=None, dtypes=None, f
         - True:  启用多线程下载数据
         - False: 禁用多线程下载
     process_count: int
-        启用多线程下载时，同时开启的线程数，默认值为设备的CPU核心数
+        启用多线程下载时，同时开启的线程数，默认值为min(32, CPU核心数 + 4)
+        数据下载是网络I/O密集型任务，使用线程而不是进程并行，下载的数据不需要在进程间传递
     chunk_size: int
         保存数据到本地时，为了减少文件/数据库读取次数，将下载的数据累计一定数量后
         再批量保存到本地，chunk_size即批量，默认值100
+        数据库数据源不需要读取本地数据，每批下载的数据直接写入数据库，此参数仅对文件数据源有效
     download_batch_size: int, default 0
         为了降低下载数据时的网络请求频率，可以在完成一批数据下载后，暂停一段时间再继续下载
         该参数指定了每次暂停之前最多可以下载的次数，该参数只有在parallel=False时有效
@@ -830,9 +832,9 @@ def refill_data_source(tables, *, channel=None, data_source=None, dtypes=None, f
     download_table_list.extend([item for item in table_list if item not in dependent_tables])
 
     if parallel:
-        print(f'into {len(table_list)} table(s) (parallely): {table_list}')
+        print(f'into {len(download_table_list)} table(s) (parallely): {download_table_list}')
     else:
-        print(f'into {len(table_list)} table(s) (sequentially): {table_list}')
+        print(f'into {len(download_table_list)} table(s) (sequentially): {download_table_list}')
 
     # 2, 循环下载数据表
     from .data_channels import parse_data_fetch_args, fetch_batched_table_data
@@ -840,7 +842,7 @@ def refill_data_source(tables, *, channel=None, data_source=None, dtypes=None, f
     table_filled = 0
     total_rows_written = 0
 
-    for table in table_list:
+    for table in download_table_list:
         # 2.1, 解析下载数据的参数
         arg_list = list(parse_data_fetch_args(
                 table=table,
@@ -879,9 +881,18 @@ def refill_data_source(tables, *, channel=None, data_source=None, dtypes=None, f
                     download_batch_interval=download_batch_interval,
             ):
                 completed += 1
-                kwargs = res['kwargs']
                 data = res['data']
-                if not data.empty:
+                if data.empty:
+                    pass
+                elif data_source.source_type == 'db':
+                    # 数据库数据源直接写入每批下载的数据，不需要在内存中累积并合并成一个大的DataFrame
+                    rows_affected = data_source.update_table_data(
+                            table=table,
+                            df=data,
+                            merge_type=merge_type,
+                    )
+                    total_written += rows_affected
+                else:
                     df_concat_list.append(data)
                 if (completed % chunk_size == 0) and (len(df_concat_list) > 0):
                     # 将下载的数据写入数据源
@@ -909,6 +920,19 @@ def refill_data_source(tables, *, channel=None, data_source=None, dtypes=None, f
             print(f'Error occurred when downloading data for table {table}: {e}')
             # import traceback
             # traceback.print_exc()
+            if df_concat_list:
+                # 出错前已经下载的数据仍然写入数据源，避免重复下载
+                try:
+                    rows_affected = data_source.update_table_data(
+                            table=table,
+                            df=pd.concat(df_concat_list, copy=False, ignore_index=True),
+                            merge_type=merge_type,
+                    )
+                    total_written += rows_affected
+                except Exception as write_err:
+                    print(f'Error occurred when writing downloaded data into table {table}: {write_err}')
+            # 出错前已经写入的数据同样计入写入数据总量
+            total_rows_written += total_written
             continue
 
         if df_concat_list:
@@ -935,7 +959,7 @@ def refill_data_source(tables, *, channel=None, data_source=None, dtypes=None, f
         table_filled += 1
         total_rows_written += total_written
 
-    print(f'\nData refill completed! {total_rows_written} rows written into {table_filled}/{len(table_list)} table(s)!')
+    print(f'\nData refill completed! {total_rows_written} rows written into {table_filled}/{len(download_table_list)} table(s)!')
 
     return None
 
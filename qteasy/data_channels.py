@@ -13,14 +13,19 @@
 # ======================================
 
 
+import os
+import numpy as np
 import pandas as pd
 import time
 
 from functools import lru_cache
+from itertools import islice, product
 
 from concurrent.futures import (
     ThreadPoolExecutor,
     as_completed,
+    wait,
+    FIRST_COMPLETED,
 )
 
 from .utilfuncs import (
@@ -28,6 +33,7 @@ from .utilfuncs import (
     list_truncate,
     list_to_str_format,
 )
+from .datatables import TABLE_MASTERS
 
 """
 这个模块提供一个统一数据下载api：
@@ -278,11 +284,9 @@ def parse_data_fetch_args(table, channel, symbols, start_date, end_date, list_ar
     if arg_type == 'list':
         arg_values = _parse_list_args(arg_range, list_arg_filter, reversed_par_seq)
     elif arg_type == 'datetime':
-        from .datatables import TABLE_MASTERS
         freq = TABLE_MASTERS[table][4]
         arg_values = _parse_datetime_args(arg_range, start_date, end_date, freq, reversed_par_seq)
     elif arg_type == 'trade_date':
-        from .datatables import TABLE_MASTERS
         freq = TABLE_MASTERS[table][4]
         arg_values = _parse_trade_date_args(arg_range, start_date, end_date, freq, 'SSE', reversed_par_seq)
     elif arg_type == 'hk_trade_date':
@@ -312,9 +316,8 @@ def parse_data_fetch_args(table, channel, symbols, start_date, end_date, list_ar
     elif additional_start_end.lower() == 'y':
         # build additional start/end args
         additional_args = _parse_additional_time_args(start_end_chunk_size, start_date, end_date)
-        import itertools
         kwargs = ({arg_name: val, **add_arg} for val, add_arg in
-                  itertools.product(arg_values, additional_args))
+                  product(arg_values, additional_args))
     else:
         raise ValueError('unexpected additional_start_end:', additional_start_end)
 
@@ -348,7 +351,8 @@ def fetch_batched_table_data(
     parallel: bool, default True
         是否并行下载数据
     process_count: int, default None
-        并行下载数据时，使用的进程数, 默认为None，表示使用cpu_count()个进程
+        并行下载数据时，使用的线程数, 默认为None，表示使用min(32, cpu_count() + 4)个线程，
+        同时提交的下载任务最多为线程数的两倍
     logger: logger
         用于记录下载数据的日志
     download_batch_size: int
@@ -382,11 +386,14 @@ def fetch_batched_table_data(
 
     else:  # parallel
         # 使用ThreadPoolExecutor循环下载数据
+        if process_count is None:
+            # 与ThreadPoolExecutor的默认线程数相同
+            process_count = min(32, (os.cpu_count() or 1) + 4)
+        max_in_flight = 2 * process_count
         with ThreadPoolExecutor(max_workers=process_count) as worker:
             # 在parallel模式下，下载线程的提交和返回是分开进行的，为了实现分批下载，必须分批提交，提交一批
             # 数据后，等待结果返回，再提交下一批，因此，需要将arg_list分段，提交完一个batch之后，返回结果，
             # 再暂停，暂停后再继续提交
-            submitted = 0
             # 将arg_list分段，每次下载batch_size个数据
             if download_batch_size == 0:
                 arg_list_chunks = [arg_list]
@@ -394,14 +401,19 @@ def fetch_batched_table_data(
                 arg_list_chunks = list_truncate(arg_list, download_batch_size, as_list=False)
 
             for arg_sub_list in arg_list_chunks:
-                futures = {}
-                for kw in arg_sub_list:
-                    futures.update({worker.submit(fetch_table_data, table, **kw): kw})
-                    submitted += 1
-                for f in as_completed(futures):
-                    kwargs = futures[f]
-                    completed += 1
-                    yield {'kwargs': kwargs, 'data': f.result()}
+                # 同时提交的下载任务数量不超过max_in_flight，每完成一个任务再提交一个新任务，
+                # 避免一次性提交所有任务，导致大量已下载的数据同时占用内存
+                arg_iter = iter(arg_sub_list)
+                futures = {worker.submit(fetch_table_data, table, **kw): kw for kw in
+                           islice(arg_iter, max_in_flight)}
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        kwargs = futures.pop(f)
+                        completed += 1
+                        yield {'kwargs': kwargs, 'data': f.result()}
+                        for kw in islice(arg_iter, 1):
+                            futures[worker.submit(fetch_table_data, table, **kw)] = kw
 
                 if download_batch_interval != 0:
                     time.sleep(download_batch_interval)
@@ -468,7 +480,7 @@ def fetch_real_time_klines(
     else:
         today = pd.Timestamp.today(tz=time_zone).strftime('%Y%m%d')
 
-    # 使用ProcessPoolExecutor, as_completed加速数据获取，当parallel=False时，不使用多进程
+    # 使用ThreadPoolExecutor, as_completed加速数据获取，当parallel=False时，不使用多线程
     if parallel:
         with ThreadPoolExecutor(max_workers=10) as executor:
             futures = {
@@ -496,7 +508,7 @@ def fetch_real_time_klines(
                     df['ts_code'] = symbol
                     k_line = df.iloc[-2:-1, :] if matured_kline_only else df.iloc[-1:, :]
                     data.append(k_line)
-    else:  # parallel == False, 不使用多进程
+    else:  # parallel == False, 不使用多线程
         for symbol in qt_codes:
             df = fetch_realtime_kline(qt_code=symbol, date=today, freq=freq)
             if df.empty:
@@ -654,9 +666,42 @@ def _parse_list_args(arg_range: str or [str], list_arg_filter: str or [str] = No
         # 确认上下限的位置
         return (item for item in arg_range[list_idx_lower:list_idx_upper + 1])
 
+    # 转换为集合后再筛选，每个参数的查找时间为O(1)
+    list_arg_filter = set(list_arg_filter)
     return (item for item in arg_range if item in list_arg_filter)
 
 
+def _parse_datetime_index(arg_range: str, start_date: str, end_date: str, freq: str = 'd') -> pd.DatetimeIndex:
+    """ 根据开始和结束日期，生成按时间顺序排列的日期序列，供其他参数解析函数在转换为字符串之前使用
+
+    Parameters
+    ----------
+    arg_range: str,
+        表示数据的时间范围的起始日期，如'20210101'表示从2021年1月1日开始
+    start_date: str, YYYYMMDD
+        数据下载的开始日期
+    end_date: str, YYYYMMDD
+        数据下载的结束日期
+    freq: str, optional
+        数据下载的频率，'d' / 'w' / 'm'
+
+    Returns
+    -------
+    pd.DatetimeIndex
+    """
+
+    start_date, end_date = _ensure_date_sequence(arg_range, start_date, end_date)
+
+    if freq is None:
+        freq = 'd'
+    if freq.lower() == 'w':
+        freq = 'w-Fri'
+    if freq.lower() == 'm':
+        freq = 'ME'
+
+    return pd.date_range(start_date, end_date, freq=freq)
+
+
 def _parse_datetime_args(arg_range: str, start_date: str, end_date: str,
                          freq: str = 'd', reversed_par_seq: bool = False):
     """ 根据开始和结束日期，生成数据获取的参数序列
@@ -683,16 +728,7 @@ def _parse_datetime_args(arg_range: str, start_date: str, end_date: str,
         用于下载数据的参数序列
     """
 
-    start_date, end_date = _ensure_date_sequence(arg_range, start_date, end_date)
-
-    if freq is None:
-        freq = 'd'
-    if freq.lower() == 'w':
-        freq = 'w-Fri'
-    if freq.lower() == 'm':
-        freq = 'ME'
-
-    res = pd.date_range(start_date, end_date, freq=freq).strftime('%Y%m%d').to_list()
+    res = _parse_datetime_index(arg_range, start_date, end_date, freq).strftime('%Y%m%d').to_list()
 
     if reversed_par_seq:
         return res[::-1]
@@ -726,22 +762,30 @@ def _parse_trade_date_args(arg_range: str, start_date: str, end_date: str,
         用于下载数据的参数序列
     """
 
-    from .utilfuncs import is_market_trade_day, nearest_market_trade_day
-    full_dates = _parse_datetime_args(arg_range, start_date, end_date, freq, reversed_par_seq)
-
+    from qteasy import QT_TRADE_CALENDAR
+    from .utilfuncs import is_market_trade_day, market_trade_days
     if freq is None:
         freq = 'd'
-    # 如果频率是月或周，分别查找所有日期的nearest_trade_day并删除重复日期
+    if (QT_TRADE_CALENDAR is None) and (freq.lower() not in ['w', 'm']):
+        # 没有交易日历时，只能逐日判断是否交易日
+        full_dates = _parse_datetime_args(arg_range, start_date, end_date, freq, reversed_par_seq)
+        return [date for date in full_dates if is_market_trade_day(date, market)]
+
+    # 全程使用DatetimeIndex在排好序的交易日序列上批量查找，只在最后转换一次字符串
+    trade_days = market_trade_days(market)
+    full_dates = _parse_datetime_index(arg_range, start_date, end_date, freq)
     if freq.lower() in ['w', 'm']:
-        trade_dates = list(map(nearest_market_trade_day, full_dates))
-        trade_dates = list(set(trade_dates))
-        trade_dates.sort(reverse=reversed_par_seq)
-        trade_dates = [date.strftime('%Y%m%d') for date in trade_dates]
+        # 如果频率是月或周，分别查找所有日期的最近交易日（当日或之前的交易日）并删除重复日期
+        positions = trade_days.get_indexer(full_dates, method='pad')
+        positions = np.unique(positions[(positions >= 0) & (full_dates <= trade_days[-1])])
+        trade_dates = trade_days[positions]
     else:
         # 如果频率是日，删除所有非交易日
-        trade_dates = [date for date in full_dates if is_market_trade_day(date, market)]
+        trade_dates = full_dates[full_dates.isin(trade_days)]
+    if reversed_par_seq:
+        trade_dates = trade_dates[::-1]
 
-    return trade_dates
+    return trade_dates.strftime('%Y%m%d').to_list()
 
 
 def _parse_table_index_args(arg_range: str, symbols: str, allowed_code_suffix: str = None,
@@ -772,20 +816,22 @@ def _parse_table_index_args(arg_range: str, symbols: str, allowed_code_suffix: s
     table_name = arg_range
 
     if table_name == 'stock_basic':
-        all_args = df_s.index.to_list()
+        all_args = df_s.index
     elif table_name == 'index_basic':
-        all_args = df_i.index.to_list()
+        all_args = df_i.index
     elif table_name == 'fund_basic':
-        all_args = df_f.index.to_list()
+        all_args = df_f.index
     elif table_name == 'future_basic':
-        all_args = df_ft.index.to_list()
+        all_args = df_ft.index
     elif table_name == 'opt_basic':
-        all_args = df_o.index.to_list()
+        all_args = df_o.index
     elif table_name == 'ths_index_basic':
-        all_args = df_ths.index.to_list()
+        all_args = df_ths.index
     else:
         raise ValueError(f'unknown table name {table_name}')
 
+    # 所有的筛选条件合并为同一个布尔掩码，对全部代码一次性向量化筛选
+    mask = np.ones(len(all_args), dtype='bool')
     if symbols is not None:  # assert symbols is a str, 进行第一次筛选
         # 冒号分隔的字符串，表示股票代码的上下限
         if ':' in symbols:
@@ -794,16 +840,18 @@ def _parse_table_index_args(arg_range: str, symbols: str, allowed_code_suffix: s
             upper = symbols[1].split('.')[0]
             if lower > upper:
                 lower, upper = upper, lower
-            all_args = [arg for arg in all_args if (lower <= arg.split('.')[0] <= upper)]
+            codes = all_args.str.split('.').str[0]
+            mask &= (codes >= lower) & (codes <= upper)
 
         else:
             symbols = str_to_list(symbols)
-            all_args = [arg for arg in all_args if arg in symbols]
+            mask &= all_args.isin(symbols)
 
     if allowed_code_suffix:  # assert allowed_code_suffix is a str, 进行第二次筛选
         suffix = str_to_list(allowed_code_suffix)
-        all_args = [arg for arg in all_args if arg[-2:] in suffix]
+        mask &= all_args.str[-2:].isin(suffix)
 
+    all_args = all_args[mask].to_list()
     if reversed_par_seq:
         all_args = all_args[::-1]
 
@@ -954,20 +1002,17 @@ def _parse_additional_time_args(chunk_size, start_date, end_date) -> list:
 
     start_date, end_date = _ensure_date_sequence('19700101', start_date, end_date)
 
-    if chunk_size is None:
-        return [{'start': start_date.strftime('%Y%m%d'), 'end': end_date.strftime('%Y%m%d')}]
-    try:
-        chunk_size = int(chunk_size)
-    except ValueError:
-        chunk_size = 0
+    # API_MAP中不分块的数据表通常将chunk_size设置为空字符串，只有正整数才需要分块下载
+    chunk_size = '' if chunk_size is None else str(chunk_size).strip()
+    chunk_size = int(chunk_size) if chunk_size.isdigit() else 0
 
     if chunk_size <= 0:
         return [{'start': start_date.strftime('%Y%m%d'), 'end': end_date.strftime('%Y%m%d')}]  # return the whole period
 
-    start_end_chunk_lbounds = list(pd.date_range(start=start_date,
-                                                 end=end_date,
-                                                 freq=f'{chunk_size}d'
-                                                 ).strftime('%Y%m%d'))
+    start_end_chunk_lbounds = pd.date_range(start=start_date,
+                                            end=end_date,
+                                            freq=f'{chunk_size}d'
+                                            ).strftime('%Y%m%d').to_list()
     start_end_chunk_rbounds = start_end_chunk_lbounds[1:]
 
     start_end_chunk_rbounds.append(end_date.strftime('%Y%m%d'))
@@ -10,6 +10,7 @@
 # ======================================
 
 import os
+import datetime
 from os import path
 import pandas as pd
 import numpy as np
@@ -38,6 +39,8 @@ from .datatables import (
     set_primary_key_frame,
 )
 
+DB_WRITE_BATCH_SIZE = 10000  # 写入数据库时每一批写入的最大数据行数
+
 
 class DataSource:
     """ DataSource 对象管理存储在本地的历史数据文件或数据库.
@@ -225,6 +228,8 @@ class DataSource:
             self.__password__ = None
 
         self._allow_drop_table = allow_drop_table
+        # 缓存写入数据库表的SQL语句及数据表的列名，同一张表的写入语句只需查询一次表结构、生成一次
+        self._db_write_sql_cache = {}
 
     @property
     def tables(self) -> list:
@@ -419,6 +424,25 @@ class DataSource:
             raise err
         return len(df)
 
+    def _append_file(self, df, file_name):
+        """ 将df中的数据添加到本地文件的末尾，不需要重写整个文件，目前仅支持csv文件
+
+        Parameters
+        ----------
+        df: 待写入文件的DataFrame,primary key 为index，列的顺序必须与文件中的列相同
+        file_name: 本地文件名(不含扩展名)
+        Returns
+        -------
+        int: 添加到文件末尾的数据行数
+        """
+        file_path_name = self._get_file_path_name(file_name)
+        if self.file_type == 'csv':
+            df.to_csv(file_path_name, mode='a', header=False, encoding='utf-8')
+        else:  # hdf/fth文件不支持直接添加数据
+            err = TypeError(f'Can not append data to file type: {self.file_type}')
+            raise err
+        return len(df)
+
     def _read_file(self, file_name, primary_key, pk_dtypes, share_like_pk=None,
                    shares=None, date_like_pk=None, start=None, end=None, chunk_size=50000):
         """ 从文件中读取DataFrame，当文件类型为csv时，支持分块读取且完成数据筛选
@@ -753,6 +777,29 @@ class DataSource:
         finally:
             self._db_close_connection(conn, cursor)
 
+    def _db_execute_many_by_batch(self, sql, df, batch_size=DB_WRITE_BATCH_SIZE) -> int:
+        """将DataFrame中的数据分批转化为tuple并执行sql语句，避免一次性生成所有数据的tuple
+
+        Parameters
+        ----------
+        sql: str
+            需要执行的sql语句
+        df: pd.DataFrame
+            需要写入的数据，列的顺序必须与sql语句中的列相同
+        batch_size: int, Default DB_WRITE_BATCH_SIZE
+            每一批写入的数据行数
+
+        Returns
+        -------
+        rows_affected: int: 执行sql语句的结果
+        """
+        rows_affected = 0
+        for batch_start in range(0, len(df), batch_size):
+            df_batch = df.iloc[batch_start:batch_start + batch_size]
+            df_tuple = tuple(df_batch.itertuples(index=False, name=None))
+            rows_affected += self._db_execute_many(sql, df_tuple)
+        return rows_affected
+
     def _read_database(self, db_table, share_like_pk=None, shares=None, date_like_pk=None, start=None, end=None):
         """ 从一张数据库表中读取数据，读取时根据share(ts_code)和dates筛选
             具体筛选的字段通过share_like_pk和date_like_pk两个字段给出
@@ -859,7 +906,7 @@ class DataSource:
                     dtypes=dtypes,
                     primary_key=primary_key)
 
-        tbl_columns = tuple(self._get_db_table_schema(db_table).keys())
+        tbl_columns, sql = self._get_db_write_sql(db_table, primary_key, update_duplicate=False)
         # TODO:
         #  实际上，下面的代码与update_database()中的代码几乎一样
         #  应该将这一大坨代码抽象出来，作为一个单独的函数，统一调用
@@ -869,17 +916,8 @@ class DataSource:
         pd_version = pd.__version__
         if pd_version >= '2.0':
             df.replace(np.nan, None, inplace=True)
-        df_tuple = tuple(df.itertuples(index=False, name=None))
-        sql = f"INSERT IGNORE INTO "
-        sql += f"`{db_table}` ("
-        for col in tbl_columns[:-1]:
-            sql += f"`{col}`, "
-        sql += f"`{tbl_columns[-1]}`)\nVALUES\n("
-        for val in tbl_columns[:-1]:
-            sql += "%s, "
-        sql += "%s)\n"
 
-        rows_affected = self._db_execute_many(sql, df_tuple)
+        rows_affected = self._db_execute_many_by_batch(sql, df)
         return rows_affected
 
     def _update_database(self, df, db_table, primary_key):
@@ -902,8 +940,7 @@ class DataSource:
         -------
         int: rows affected
         """
-        tbl_columns = tuple(self._get_db_table_schema(db_table).keys())
-        update_cols = [item for item in tbl_columns if item not in primary_key]
+        tbl_columns, sql = self._get_db_write_sql(db_table, primary_key, update_duplicate=True)
         # 确保df的列与数据库表的列相同
         if (len(df.columns) != len(tbl_columns)) or (any(i_d != i_t for i_d, i_t in zip(df.columns, tbl_columns))):
             raise KeyError(f'df columns {df.columns.to_list()} does not fit table schema {list(tbl_columns)}')
@@ -916,22 +953,56 @@ class DataSource:
             #  op=qt.Operator('dma')
             #  op.run(mode=0, live_trade_account_id=1, asset_type='IDX')
 
-        df_tuple = tuple(df.itertuples(index=False, name=None))
-        sql = f"INSERT INTO "
+        rows_affected = self._db_execute_many_by_batch(sql, df)
+        return rows_affected
+
+    def _get_db_write_sql(self, db_table, primary_key, update_duplicate):
+        """ 获取向数据库表写入数据的SQL语句以及数据表的列名
+
+        同一张表的SQL语句只生成一次并缓存起来，后续写入同一张表时直接使用缓存的SQL语句，
+        省去每次写入时查询表结构以及拼接SQL语句的开销。数据表被删除时缓存会被清除
+
+        Parameters
+        ----------
+        db_table: str
+            需要写入的数据表
+        primary_key: tuple
+            数据表的primary_key
+        update_duplicate: bool
+            True时生成INSERT ... ON DUPLICATE KEY UPDATE语句，键值冲突时更新记录，
+            False时生成INSERT IGNORE语句，键值冲突时忽略新的记录
+
+        Returns
+        -------
+        tuple: (tbl_columns, sql)
+        """
+        cache_key = (db_table, tuple(primary_key) if primary_key is not None else None, update_duplicate)
+        cached = self._db_write_sql_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        tbl_columns = tuple(self._get_db_table_schema(db_table).keys())
+        if len(tbl_columns) == 0:
+            # 数据表不存在或无法读取表结构时不生成SQL，也不缓存，由调用者报告列名不匹配的错误
+            return tbl_columns, None
+
+        sql = "INSERT INTO " if update_duplicate else "INSERT IGNORE INTO "
         sql += f"`{db_table}` ("
         for col in tbl_columns[:-1]:
             sql += f"`{col}`, "
         sql += f"`{tbl_columns[-1]}`)\nVALUES\n("
         for val in tbl_columns[:-1]:
             sql += "%s, "
-        sql += "%s)\n" \
-               "ON DUPLICATE KEY UPDATE\n"
-        for col in update_cols[:-1]:
-            sql += f"`{col}`=VALUES(`{col}`),\n"
-        sql += f"`{update_cols[-1]}`=VALUES(`{update_cols[-1]}`)"
+        sql += "%s)\n"
+        if update_duplicate:
+            update_cols = [item for item in tbl_columns if item not in primary_key]
+            sql += "ON DUPLICATE KEY UPDATE\n"
+            for col in update_cols[:-1]:
+                sql += f"`{col}`=VALUES(`{col}`),\n"
+            sql += f"`{update_cols[-1]}`=VALUES(`{update_cols[-1]}`)"
 
-        rows_affected = self._db_execute_many(sql, df_tuple)
-        return rows_affected
+        self._db_write_sql_cache[cache_key] = (tbl_columns, sql)
+        return tbl_columns, sql
 
     def _delete_database_records(self, db_table, primary_key, record_ids):
         """ 从数据库表中删除数据
@@ -979,7 +1050,6 @@ class DataSource:
         Returns
         -------
         """
-        import datetime
         if not self._db_table_exists(db_table):
             return list()
         sql = f'SELECT DISTINCT `{column}`' \
@@ -1007,7 +1077,6 @@ class DataSource:
         -------
         list: [min, max, count]
         """
-        import datetime
         if not self._db_table_exists(db_table):
             return list()
         if with_count:
@@ -1151,6 +1220,9 @@ class DataSource:
         sql = f"DROP TABLE IF EXISTS {db_table};"
 
         self._db_execute_one(sql, fetch_and_return=False)
+        # 数据表被删除后，重建的数据表结构可能不同，清除该表缓存的写入SQL语句
+        for cache_key in [k for k in self._db_write_sql_cache if k[0] == db_table]:
+            del self._db_write_sql_cache[cache_key]
 
     def _get_db_table_size(self, db_table):
         """ 获取数据库表的占用磁盘空间
@@ -1233,6 +1305,25 @@ class DataSource:
                 primary_key_in_index=primary_key_in_index,
         )
 
+    def _clear_table_data_cache(self, table):
+        """ 数据表被写入或删除后，清除与该表相关的读取缓存，确保之后读取的是最新的数据
+
+        Parameters
+        ----------
+        table: str
+            被修改的数据表名
+
+        Returns
+        -------
+        None
+        """
+        # lru_cache无法按表清除，而写入数据表的频率远低于读取，因此直接清空全部缓存
+        self.read_cached_table_data.cache_clear()
+        if table in ['stock_basic', 'index_basic', 'fund_basic', 'future_basic', 'opt_basic', 'ths_index_basic']:
+            self._get_all_basic_table_data.cache_clear()
+
+        return None
+
     def read_table_data(self, table, *,
                         shares: str = None,
                         start: str = None,
@@ -1482,6 +1573,7 @@ class DataSource:
             else:  # for unexpected cases
                 raise KeyError(f'Invalid process mode on duplication: {on_duplicate}')
         self._table_list.add(table)
+        self._clear_table_data_cache(table)
         return rows_affected
 
     def update_table_data(self, table, df, merge_type='update') -> int:
@@ -1548,18 +1640,39 @@ class DataSource:
             local_data = self.read_table_data(table)
             set_primary_key_index(dnld_data, primary_key=primary_keys, pk_dtypes=pk_dtypes)
             # 根据merge_type处理重叠部分：
+            local_overlapped = False
             if merge_type == 'ignore':
                 # 丢弃下载数据中的重叠部分
                 dnld_data = dnld_data[~dnld_data.index.isin(local_data.index)]
             elif merge_type == 'update':  # 用下载数据中的重叠部分覆盖本地数据，下载数据不变，丢弃本地数据中的重叠部分(仅用于本地文件保存的情况)
-                local_data = local_data[~local_data.index.isin(dnld_data.index)]
+                overlapped = local_data.index.isin(dnld_data.index)
+                local_overlapped = overlapped.any()
+                if local_overlapped:
+                    local_data = local_data[~overlapped]
             else:  # for unexpected cases
                 raise KeyError(f'Invalid merge type, got "{merge_type}"')
-            rows_affected = self.write_table_data(pd.concat([local_data, dnld_data]), table=table)
+            appendable = (self.file_type == 'csv') and (not local_data.empty) and (not local_overlapped) and \
+                         (local_data.index.names == dnld_data.index.names) and \
+                         (local_data.columns.to_list() == dnld_data.columns.to_list())
+            if appendable:
+                # 本地数据不需要修改时，直接将新增数据添加到csv文件末尾，避免合并并重写整个文件
+                rows_affected = self._append_file(dnld_data, file_name=table)
+                self._table_list.add(table)
+            else:
+                rows_affected = self.write_table_data(pd.concat([local_data, dnld_data]), table=table)
         elif self.source_type == 'db':
-            rows_affected = self.write_table_data(df=dnld_data, table=table, on_duplicate=merge_type)
+            # 当merge_type == 'update'时，甚至不需要下载本地数据，重叠部分由数据库通过ON DUPLICATE KEY UPDATE
+            # 或INSERT IGNORE处理，此时dnld_data的列已经与数据表一致，直接写入数据库即可
+            if not self._db_table_exists(table):
+                self._new_db_table(db_table=table, columns=table_columns, dtypes=dtypes, primary_key=primary_keys)
+            if merge_type == 'ignore':
+                rows_affected = self._write_database(dnld_data, db_table=table, primary_key=primary_keys)
+            else:  # merge_type == 'update'
+                rows_affected = self._update_database(dnld_data, db_table=table, primary_key=primary_keys)
+            self._table_list.add(table)
         else:  # unexpected case
             raise KeyError(f'invalid data source type: {self.source_type}')
+        self._clear_table_data_cache(table)
 
         return rows_affected
 
@@ -1591,6 +1704,7 @@ class DataSource:
         elif self.source_type == 'file':
             self._drop_file(file_name=table)
         self._table_list.difference_update([table])
+        self._clear_table_data_cache(table)
         return None
 
     def get_table_data_coverage(self, table, column, min_max_only=False):
@@ -1936,6 +2050,10 @@ class DataSource:
         if record_id is not None and record_id <= 0:
             return {}
 
+        # 数据库中的数据表直接按主键读取一条记录，不需要读取整个数据表
+        if (self.source_type == 'db') and (record_id is not None) and (not kwargs):
+            return self._read_db_sys_table_record(table, record_id=record_id)
+
         data = self.read_sys_table_data(table, **kwargs)
         if data.empty:
             return {}
@@ -1945,6 +2063,41 @@ class DataSource:
 
         return data.loc[record_id].to_dict()
 
+    def _read_db_sys_table_record(self, table, *, record_id: int) -> dict:
+        """ 从数据库中按主键读取系统操作表的一条记录，返回一个dict，格式与read_sys_table_record()相同
+
+        Parameters
+        ----------
+        table: str
+            需要读取的数据表名称
+        record_id: int
+            需要读取的数据的id
+
+        Returns
+        -------
+        data: dict
+            读取的记录，不包含主键，记录不存在时返回空dict
+        """
+
+        from .datatables import ensure_sys_table
+        ensure_sys_table(table)
+        if not self._db_table_exists(table):
+            return {}
+
+        columns, dtypes, p_keys, pk_dtypes = get_built_in_table_schema(table)
+        primary_key = p_keys[0]
+        # 按数据表定义的列名读取数据，确保列的顺序与read_sys_table_data()读取的结果相同
+        column_str = ', '.join(f'`{col}`' for col in columns)
+        sql = f'SELECT {column_str} FROM `{table}` WHERE `{primary_key}` = %s'
+        res = self._db_execute_one(sql, (int(record_id),))
+        if not res:
+            return {}
+
+        # 与read_sys_table_data()读取数据库表的处理方式相同，生成DataFrame并设置主键，保证返回的数据类型一致
+        record = pd.DataFrame(res, columns=columns)
+        set_primary_key_index(record, primary_key=p_keys, pk_dtypes=pk_dtypes)
+        return record.iloc[0].to_dict()
+
     def update_sys_table_data(self, table: str, record_id: int, **data) -> int:
         """ 更新系统操作表的数据，根据指定的id更新数据，更新的内容由kwargs给出。
 
@@ -2005,7 +2158,44 @@ class DataSource:
         # 更新original_data
         table_data.update(data)
 
-        df_data = pd.DataFrame(table_data, index=[record_id])
+        return self.update_sys_table_record(table, record_id=record_id, record=table_data)
+
+    def update_sys_table_record(self, table: str, *, record_id: int, record: dict) -> int:
+        """ 用一条完整的记录覆盖系统操作表中record_id对应的记录，不再读取数据表中原有的记录
+
+        适用于调用者已经读取了完整的记录（例如通过read_sys_table_record()），在内存中修改后写回数据表的情况，
+        与update_sys_table_data()相比省去了一次读取整个数据表的操作
+
+        Parameters
+        ----------
+        table: str
+            需要更新的数据表名称
+        record_id: int
+            需要更新的数据的id
+        record: dict
+            完整的记录，必须包含数据表的全部数据字段
+
+        Returns
+        -------
+        id: int
+            更新的记录ID
+
+        Raises
+        ------
+        KeyError: 当record中的字段与数据表的数据字段不一致时
+        """
+
+        from .datatables import ensure_sys_table
+        ensure_sys_table(table)
+
+        columns, dtypes, p_keys, pk_dtypes = get_built_in_table_schema(table)
+        data_columns = [col for col in columns if col not in p_keys]
+        if any(k not in data_columns for k in record.keys()) or any(k not in record.keys() for k in data_columns):
+            err = KeyError(f'Record keys must be the same as the table data columns, '
+                           f'got {list(record.keys())} vs {data_columns}')
+            raise err
+
+        df_data = pd.DataFrame(record, index=[record_id])
         df_data.index.name = p_keys[0]
         self.update_table_data(table, df_data, merge_type='update')
         return record_id
@@ -2106,6 +2296,52 @@ class DataSource:
         #  test_database和test_trading测试都能通过，后续完整测试
         return record_id
 
+    def insert_sys_table_records(self, table: str, records: list) -> list:
+        """ 一次插入多条系统操作表的记录
+
+        与insert_sys_table_data()相同，但是所有记录一次写入数据表，只需读取一次最后一个ID，写入一次数据，
+        适用于需要连续插入多条记录的情况，例如批量保存交易订单
+
+        Parameters
+        ----------
+        table: str
+            需要插入数据的数据表名称
+        records: list of dict
+            需要插入的数据，每个dict为一条记录，其key必须与数据表的数据字段完全相同，否则会抛出异常
+
+        Returns
+        -------
+        record_ids: list of int
+            插入的记录的ID，顺序与records相同
+
+        Raises
+        ------
+        KeyError: 当某条记录的字段不完整或者有不可用的字段时
+        """
+
+        from .datatables import ensure_sys_table
+        ensure_sys_table(table)
+        if len(records) == 0:
+            return []
+
+        columns, dtypes, primary_keys, pk_dtypes = get_built_in_table_schema(table)
+        data_columns = [col for col in columns if col not in primary_keys]
+        for data in records:
+            if any(k not in data_columns for k in data.keys()) or any(k not in data.keys() for k in data_columns):
+                err = KeyError(f'Input data keys must be the same as the table data columns, '
+                               f'got {list(data.keys())} vs {data_columns}')
+                raise err
+        last_id = self.get_sys_table_last_id(table)
+        first_id = last_id + 1 if last_id is not None else 1
+        record_ids = list(range(first_id, first_id + len(records)))
+        df = pd.DataFrame(records, index=record_ids)
+        df = df.reindex(columns=columns)
+        df.index.name = primary_keys[0]
+
+        # 插入数据
+        self.update_table_data(table, df, merge_type='ignore')
+        return record_ids
+
     def delete_sys_table_data(self, table: str, record_ids: (list, tuple)) -> int:
         """ 删除系统数据表中的某些记录，被删除的记录的ID使用列表或tuple传入
 
@@ -2154,6 +2390,7 @@ class DataSource:
         else:
             err = RuntimeError(f'invalid source type: {self.source_type}')
             raise err
+        self._clear_table_data_cache(table)
 
         return res
 
@@ -1710,16 +1710,17 @@ def set_primary_key_index(df, primary_key, pk_dtypes):
     pk_count = len(primary_key)
     if pk_count == 1:
         # 当primary key只包含一列时，创建single index
-        df.index = df[primary_key[0]]
+        df.index = pd.Index(df[primary_key[0]].values, name=primary_key[0])
     elif pk_count > 1:
-        # 当primary key包含多列时，创建MultiIndex
-        m_index = pd.MultiIndex.from_frame(df[primary_key])
+        # 当primary key包含多列时，直接从各列的数据创建MultiIndex，不需要先复制出主键列的DataFrame
+        m_index = pd.MultiIndex.from_arrays([df[key].values for key in primary_key], names=primary_key)
         df.index = m_index
     else:
         # for other unexpected cases
         err = ValueError(f'wrong input!')
         raise err
-    df.drop(columns=primary_key, inplace=True)
+    for key in primary_key:
+        del df[key]
 
     return None
 
@@ -1784,16 +1785,17 @@ def set_primary_key_frame(df: pd.DataFrame, primary_key: [str], pk_dtypes: [str]
 
     if idx_columns != [None]:
         # index中有值，需要将index中的值放入DataFrame中
-        index_frame = df.index.to_frame()
         for col in idx_columns:
-            df[col] = index_frame[col]
+            df[col] = df.index.get_level_values(col)
 
     df.index = range(len(df))
-    # 此时primary key有可能被放到了columns的最后面，需要将primary key移动到columns的最前面：
-    columns = df.columns.to_list()
-    new_col = [col for col in columns if col not in pk_columns]
-    new_col = pk_columns + new_col
-    df = df.reindex(columns=new_col, copy=False)
+    # 此时primary key有可能被放到了columns的最后面，需要将primary key移动到columns的最前面，
+    # 在浅拷贝上逐列移动而不是reindex整个DataFrame，primary key已经在最前面时不需要移动
+    # 返回的df在后续处理中可能被删除列，浅拷贝可以确保传入的df的列不受影响，同时不会复制数据
+    df = df.copy(deep=False)
+    if df.columns[:len(pk_columns)].to_list() != pk_columns:
+        for i, col in enumerate(pk_columns):
+            df.insert(i, col, df.pop(col))
 
     # 设置正确的时间日期格式(找到pk_dtype中是否有"date"或"TimeStamp"类型，将相应的列设置为TimeStamp
     set_datetime_format_frame(df, primary_key, pk_dtypes)
@@ -1849,7 +1851,8 @@ def set_datetime_format_frame(df, primary_key: [str], pk_dtypes: [str]) -> None:
         # 需要设置正确的时间日期格式：
         # 有时候pk会包含多列，可能有多个时间日期，因此需要逐个设置
         for pk_item, dtype in zip(primary_key, pk_dtypes):
-            if dtype in datetime_dtypes:
+            # 已经是时间日期类型的列不需要重复转换
+            if (dtype in datetime_dtypes) and (not pd.api.types.is_datetime64_any_dtype(df[pk_item])):
                 df[pk_item] = pd.to_datetime(df[pk_item])
     return None
 
@@ -1908,21 +1911,55 @@ def get_primary_key_range(df, primary_key: [str], pk_dtypes: [str]) -> dict:
     {'start': Timestamp('1970-01-01 00:00:00.000000001'), 'end': Timestamp('1970-01-01 00:00:00.000000003')}
 
     """
-    if df.index.name is not None:
-        df = set_primary_key_frame(df, primary_key=primary_key, pk_dtypes=pk_dtypes)
+    # 直接从index或列中读取主键的值，不需要把index重新放回DataFrame中
+    pk_in_index = df.index.name is not None
+    index_names = list(df.index.names)
     res = {}
     for pk, dtype in zip(primary_key, pk_dtypes):
+        if pk in index_names:
+            pk_values = df.index.get_level_values(pk)
+        else:
+            pk_values = df[pk]
         if (dtype == 'str') or (dtype[:7] == 'varchar'):
-            res['shares'] = (list(set(df[pk].values)))
+            res['shares'] = pk_values.unique().tolist()
         elif dtype.lower() in ['date', 'timestamp', 'datetime', 'int', 'float', 'double']:
-            res['start'] = df[pk].min()
-            res['end'] = df[pk].max()
+            if pk_in_index and (dtype in ['date', 'datetime', 'TimeStamp']) and \
+                    (not pd.api.types.is_datetime64_any_dtype(pk_values)):
+                pk_values = pd.to_datetime(pk_values)
+            res['start'] = pk_values.min()
+            res['end'] = pk_values.max()
         else:
             raise KeyError(f'invalid dtype: {dtype}')
     return res
 
 
-@lru_cache(maxsize=16)
+@lru_cache(maxsize=None)
+def _get_full_table_schema(table) -> tuple:
+    """ 从TABLE_MASTERS和TABLE_SCHEMA中一次性读取数据表的全部结构信息并缓存
+
+    内置数据表的结构是固定的，因此每张表只需要解析一次，不需要限制缓存大小
+
+    Parameters
+    ----------
+    table: str
+        表名称(注意不是表的结构名称)
+
+    Returns
+    -------
+    Tuple: (columns, dtypes, remarks, primary_keys, pk_dtypes)
+    """
+    table_schema = TABLE_MASTERS[table][TABLE_MASTER_COLUMNS.index('schema')]
+    schema = TABLE_SCHEMA[table_schema]
+    columns = schema['columns']
+    dtypes = schema['dtypes']
+    remarks = schema['remarks']
+    pk_loc = schema['prime_keys']
+    primary_keys = [columns[i] for i in pk_loc]
+    pk_dtypes = [dtypes[i] for i in pk_loc]
+
+    return columns, dtypes, remarks, primary_keys, pk_dtypes
+
+
 def get_built_in_table_schema(table, *, with_remark=False, with_primary_keys=True) -> tuple:
     """ 给出数据表的名称，从相关TABLE中找到表的主键名称及其数据类型
 
@@ -1946,17 +1983,10 @@ def get_built_in_table_schema(table, *, with_remark=False, with_primary_keys=Tru
     if not isinstance(table, str):
         err = TypeError(f'table name should be a string, got {type(table)} instead')
         raise err
-    if table not in TABLE_MASTERS.keys():
+    if table not in TABLE_MASTERS:
         raise KeyError(f'invalid table name')
 
-    table_schema = TABLE_MASTERS[table][TABLE_MASTER_COLUMNS.index('schema')]
-    schema = TABLE_SCHEMA[table_schema]
-    columns = schema['columns']
-    dtypes = schema['dtypes']
-    remarks = schema['remarks']
-    pk_loc = schema['prime_keys']
-    primary_keys = [columns[i] for i in pk_loc]
-    pk_dtypes = [dtypes[i] for i in pk_loc]
+    columns, dtypes, remarks, primary_keys, pk_dtypes = _get_full_table_schema(table)
 
     if (not with_remark) and with_primary_keys:
         return columns, dtypes, primary_keys, pk_dtypes
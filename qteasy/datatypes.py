@@ -12,7 +12,10 @@
 # ======================================
 
 
+import os
 import pandas as pd
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from warnings import warn
 from math import ceil
@@ -20,6 +23,7 @@ from math import ceil
 from .utilfuncs import (
     AVAILABLE_ASSET_TYPES,
     str_to_list,
+    cached_str_to_list,
     _lev_ratio,
     _partial_lev_ratio,
     _wildcard_match,
@@ -40,14 +44,13 @@ def define(name, freq, asset_type, description, acquisition_type, **kwargs):
     kwargs: dict
     """
     global DATA_TYPE_MAP
-    global DATA_TYPE_MAP_COLUMNS
-    global DATA_TYPE_MAP_INDEX_NAMES
 
     key = (name, freq, asset_type)
     if key in DATA_TYPE_MAP:
         raise ValueError(f'DataType {key} already exists in DATA_TYPE_MAP.')
     DATA_TYPE_MAP[key] = [description, acquisition_type, kwargs]
-    DATA_TYPE_MAP_INDEX_NAMES = list(set(DATA_TYPE_MAP_INDEX_NAMES) | set(key))
+    # 数据类型清单只在模块中生成一次并被缓存，修改DATA_TYPE_MAP后必须清除缓存并重新生成
+    _get_built_in_data_type_map.cache_clear()
     _get_built_in_data_type_map()
 
 
@@ -108,19 +111,19 @@ def infer_data_types(names, freqs, asset_types, adj=None,
     """
 
     if isinstance(names, str):
-        names = str_to_list(names)
+        names = cached_str_to_list(names)
     if not isinstance(names, list):
         err = TypeError(f'names should be a string of list of strings, but got {type(names)}')
         raise err
 
     if isinstance(freqs, str):
-        freqs = str_to_list(freqs)
+        freqs = cached_str_to_list(freqs)
     if not isinstance(freqs, list):
         err = TypeError(f'freqs should be a string or a list of strings, but got {type(freqs)}')
         raise err
 
     if isinstance(asset_types, str):
-        asset_types = str_to_list(asset_types)
+        asset_types = cached_str_to_list(asset_types)
     if not isinstance(asset_types, list):
         err = TypeError(f'asset_types should be a string or a list of strings, but got {type(asset_types)}')
         raise err
@@ -776,7 +779,7 @@ class DataType:
         if data_series.empty:
             return pd.DataFrame()
 
-        unstacked_df = data_series.unstack(level=0)
+        unstacked_df = _unstack_symbols(data_series, level=0)
 
         return unstacked_df
 
@@ -800,13 +803,13 @@ class DataType:
 
         if acquired_data.empty:
             return pd.DataFrame()
-        acquired_data = acquired_data[column].unstack(level='ts_code')
+        acquired_data = _unstack_symbols(acquired_data[column], level='ts_code')
 
         adj_factors = datasource.read_cached_table_data(adj_table, shares=symbols, start=starts, end=ends)
 
         if adj_factors.empty:
             return pd.DataFrame()
-        adj_factors = adj_factors[adj_column].unstack(level='ts_code')
+        adj_factors = _unstack_symbols(adj_factors[adj_column], level='ts_code')
 
         adj_factors = adj_factors.reindex(acquired_data.index, method='ffill')
 
@@ -930,7 +933,7 @@ class DataType:
         if data_series.empty:
             return pd.DataFrame()
 
-        data_df = data_series.unstack(level='ts_code')
+        data_df = _unstack_symbols(data_series, level='ts_code')
 
         try:
             # expand the index to include starts and ends dates
@@ -971,7 +974,7 @@ class DataType:
         if data_series.empty:
             return pd.DataFrame()
 
-        signals = data_series.unstack(level='ts_code')
+        signals = _unstack_symbols(data_series, level='ts_code')
 
         # if index is a MultiIndex with multiple datetime levels, use the last level as the date index
         if isinstance(signals.index, pd.MultiIndex):
@@ -4035,6 +4038,51 @@ def _expand_df_index(df: pd.DataFrame, starts: str, ends: str) -> pd.DataFrame:
     return df.reindex(expanded_index).sort_index(ascending=True)
 
 
+def _unstack_symbols(data_series: pd.Series, level=0) -> pd.DataFrame:
+    """将index为两层MultiIndex(如ts_code/trade_date)的Series展开为DataFrame，level层的值作为columns
+
+    MultiIndex中各层的值已经以整数codes的形式存储，对于数值型数据，直接使用codes将数据填入
+    二维数组，避免pandas unstack时对证券代码字符串重新进行哈希和分组。非数值型数据，或者
+    index中存在重复值/空值时，仍然使用pandas的unstack，结果与unstack完全相同
+    """
+    index = data_series.index
+    if data_series.empty or (not isinstance(index, pd.MultiIndex)) or (index.nlevels != 2):
+        return data_series.unstack(level=level)
+    if not (pd.api.types.is_float_dtype(data_series.dtype) or pd.api.types.is_integer_dtype(data_series.dtype)):
+        return data_series.unstack(level=level)
+
+    index = index.remove_unused_levels()
+    col_level = index.names.index(level) if isinstance(level, str) else level
+    row_level = 1 - col_level
+    row_codes = index.codes[row_level]
+    col_codes = index.codes[col_level]
+    row_labels = index.levels[row_level]
+    col_labels = index.levels[col_level]
+    if (row_codes.min() < 0) or (col_codes.min() < 0):
+        return data_series.unstack(level=level)
+
+    flat_codes = row_codes.astype('int64') * len(col_labels) + col_codes
+    cell_count = len(row_labels) * len(col_labels)
+    if np.bincount(flat_codes, minlength=cell_count).max() > 1:
+        # index存在重复值，交给unstack处理(报错)
+        return data_series.unstack(level=level)
+
+    values = data_series.to_numpy()
+    if len(values) < cell_count:
+        # 存在缺失值时，与unstack一致，整数型数据转换为float64，浮点型数据保持原有精度
+        fill_dtype = values.dtype if pd.api.types.is_float_dtype(values.dtype) else 'float64'
+        res_values = np.full(cell_count, np.nan, dtype=fill_dtype)
+    else:
+        res_values = np.empty(cell_count, dtype=values.dtype)
+    res_values[flat_codes] = values
+
+    return pd.DataFrame(
+            res_values.reshape(len(row_labels), len(col_labels)),
+            index=row_labels,
+            columns=col_labels,
+    )
+
+
 def get_history_data_from_source(
         datasource,
         htypes: [DataType], *,
@@ -4129,13 +4177,24 @@ def get_history_data_from_source(
     if not htypes:
         raise ValueError(f'at least one DataType should be given, 0 is given!')
 
-    # 逐个获取每一个历史数据类型的数据
     for htype in htypes:
         # 检查数据类型是否属于历史数据，参考数据和基本信息数据不能通过此方法获取
         if htype.freq == 'none' or htype.asset_type == 'none':
             raise ValueError(f'Invalid data type {htype.name}, not a history data type')
-        # 从数据源获取数据，
-        df = htype.get_data_from_source(datasource, symbols=qt_codes, starts=start, ends=end)
+
+    # 从数据源获取数据，各个数据类型的读取互不相关，且主要耗时在I/O上，有多个数据类型时使用线程池同时读取，
+    # 读取结果的顺序与htypes的顺序相同
+    def read_htype_data(htype):
+        return htype.get_data_from_source(datasource, symbols=qt_codes, starts=start, ends=end)
+
+    if len(htypes) > 1:
+        with ThreadPoolExecutor(max_workers=min(len(htypes), (os.cpu_count() or 1) + 4)) as executor:
+            htype_dfs = list(executor.map(read_htype_data, htypes))
+    else:
+        htype_dfs = [read_htype_data(htype) for htype in htypes]
+
+    # 逐个整理每一个历史数据类型的数据
+    for htype, df in zip(htypes, htype_dfs):
         if not combine_htype_names:
             # 下载的数据不会按htype.name合并，而是分别按htype.id存储
             history_data_acquired[htype.id] = df
@@ -4164,7 +4223,7 @@ def get_history_data_from_source(
         raise err
 
     # 整理数据，确保每一个htype的DataFrame的columns与shares相同
-    qt_codes = str_to_list(qt_codes)
+    qt_codes = cached_str_to_list(qt_codes)
 
     for htyp, df in history_data_acquired.items():
         df = df.reindex(columns=qt_codes)
@@ -4448,12 +4507,14 @@ def find_history_data(s, match_description=False, fuzzy=False, freq=None, asset_
             result_columns = ['n_matched']
 
         for where, how, res in zip(where_to_look, match_how, result_columns):
+            # 同一个数据名称会在不同的频率和资产类型中重复出现，只需要对不重复的字符串计算一次匹配度
+            unique_items = data_table_map[where].unique()
             if ('?' in s) or ('*' in s):
-                matched = _wildcard_match(s, data_table_map[where])
-                match_values = [1 if item in matched else 0 for item in data_table_map[where]]
+                matched = set(_wildcard_match(s, unique_items))
+                item_values = {item: 1 if item in matched else 0 for item in unique_items}
             else:
-                match_values = list(map(how, [s] * len(data_table_map[where]), data_table_map[where]))
-            data_table_map[res] = match_values
+                item_values = {item: how(s, item) for item in unique_items}
+            data_table_map[res] = data_table_map[where].map(item_values)
 
     data_table_map['matched'] = data_table_map['n_matched'] + data_table_map['d_matched']
     data_table_map = data_table_map.loc[data_table_map['matched'] >= match_threshold]
@@ -12,12 +12,17 @@
 import pandas as pd
 import numpy as np
 
+from numba import njit
+
 from qteasy.utilfuncs import (
     str_to_list,
+    cached_str_to_list,
     list_to_str_format,
     list_or_slice,
     labels_to_dict,
     ffill_3d_data,
+    count_non_nan_3d_data,
+    has_nan_3d_data,
     fill_nan_data,
     fill_inf_data,
     pandas_freq_alias_version_conversion,
@@ -84,6 +89,7 @@ class HistoryPanel():
     columns: dict, 该属性返回一个dict， 包含所有列标签(数据类型)及其对应的列编号
     shares: list, 该属性包含所有层标签，即所有股票代码
     hdates: list, 该属性包含所有行标签，即所有日期时间
+    hdates_array: np.ndarray, 该属性以ndarray的形式包含所有行标签，即所有日期时间
     htypes: list, 该属性包含所有列标签，即所有历史数据类型
 
     Methods
@@ -96,6 +102,8 @@ class HistoryPanel():
         该方法用于将两个HistoryPanel对象合并为一个HistoryPanel对象
     slice_to_dataframe(self, slicer)
         该方法用于将HistoryPanel的一个切片转化为pandas DataFrame对象
+    to_htype_arrays(self, dtype=None)
+        该方法用于将HistoryPanel按数据类型拆分为若干个连续存储的二维数组
     flatten_to_dataframe(self, level=None, htype=None)
         该方法用于将HistoryPanel转化为一个multi-index DataFrame对象
 
@@ -132,6 +140,14 @@ class HistoryPanel():
         self._levels = None
         self._columns = None
         self._rows = None
+        # 标签列表的缓存，在首次访问shares/hdates/htypes时生成，修改标签时清除
+        self._shares_cache = None
+        self._share_index_cache = None
+        self._hdates_cache = None
+        self._hdates_array_cache = None
+        self._hdate_index_cache = None
+        self._htypes_cache = None
+        self._htype_index_cache = None
         if values is None or values.size == 0:
             self._l_count, self._r_count, self._c_count = (0, 0, 0)
             self._values = None
@@ -178,7 +194,7 @@ class HistoryPanel():
             assert isinstance(rows, (list, dict, pd.DatetimeIndex)), \
                 f'TypeError, input_hdates should be a list or DatetimeIndex, got {type(rows)} instead'
             try:
-                new_rows = [pd.to_datetime(date) for date in rows]
+                new_rows = _to_timestamp_list(rows)
             except:
                 raise ValueError('one or more item in hdate list can not be converted to Timestamp')
             self._rows = labels_to_dict(new_rows, range(self._r_count))
@@ -186,6 +202,44 @@ class HistoryPanel():
             # 建立列标签序号字典
             self._columns = labels_to_dict(columns, range(self._c_count))
 
+    @classmethod
+    def _from_internals(cls, values: np.ndarray, levels: dict, rows: dict, columns: dict):
+        """ 直接使用已经建立好的标签序号字典生成一个HistoryPanel，仅供内部使用
+
+        与__init__不同，这里不检查数据和标签，也不重新解析日期标签或建立标签字典，调用者需保证
+        values是非空的三维数组，且三个字典都是{label: 0 ~ n-1}的形式并与values的形状一致
+
+        Parameters
+        ----------
+        values: ndarray
+            三维数组，直接作为新HistoryPanel的values
+        levels: dict
+            层标签序号字典
+        rows: dict
+            行标签（日期）序号字典，标签必须已经是pd.Timestamp
+        columns: dict
+            列标签序号字典
+
+        Returns
+        -------
+        out : HistoryPanel
+        """
+        hp = cls.__new__(cls)
+        hp._values = values
+        hp._levels = levels
+        hp._rows = rows
+        hp._columns = columns
+        hp._l_count, hp._r_count, hp._c_count = values.shape
+        hp._is_empty = False
+        hp._shares_cache = None
+        hp._share_index_cache = None
+        hp._hdates_cache = None
+        hp._hdates_array_cache = None
+        hp._hdate_index_cache = None
+        hp._htypes_cache = None
+        hp._htype_index_cache = None
+        return hp
+
     @property
     def is_empty(self):
         """判断HistoryPanel是否为空"""
@@ -217,10 +271,13 @@ class HistoryPanel():
     @property
     def shares(self):
         """返回HistoryPanel的层标签——股票列表"""
-        if self.is_empty:
+        # 缓存命中时直接返回，空HistoryPanel不会生成缓存
+        if self._shares_cache is not None:
+            return self._shares_cache
+        if self._is_empty:
             return 0
-        else:
-            return list(self._levels.keys())
+        self._shares_cache = list(self._levels.keys())
+        return self._shares_cache
 
     @shares.setter
     def shares(self, input_shares):
@@ -231,6 +288,8 @@ class HistoryPanel():
                 f'ValueError, the number of input shares ({len(input_shares)}) does not match level ' \
                 f'count ({self.level_count})'
             self._levels = labels_to_dict(input_shares, self.shares)
+            self._shares_cache = None
+            self._share_index_cache = None
 
     @property
     def level_count(self):
@@ -271,11 +330,13 @@ class HistoryPanel():
         #  这样就可以用 HP.hdates.date / HP.hdates.where()
         #  等等方法和属性了
         #  shares 和 htypes 属性也可以如法炮制
-        if self.is_empty:
+        if self._hdates_cache is not None:
+            return self._hdates_cache
+        if self._is_empty:
             return 0
-        else:
-            # return pd.Index(self._rows.keys(), dtype='datetime64')
-            return list(self._rows.keys())
+        # return pd.Index(self._rows.keys(), dtype='datetime64')
+        self._hdates_cache = list(self._rows.keys())
+        return self._hdates_cache
 
     @hdates.setter
     def hdates(self, input_hdates: list):
@@ -287,11 +348,45 @@ class HistoryPanel():
                 error = f'the number of input shares ({len(input_hdates)}) does not match level count ({self.row_count})'
                 raise ValueError(error)
             try:
-                new_hdates = [pd.to_datetime(date) for date in input_hdates]
+                new_hdates = _to_timestamp_list(input_hdates)
             except Exception as e:
                 error = f'{e} one or more item in hdate list can not be converted to Timestamp'
                 raise ValueError(error)
             self._rows = labels_to_dict(new_hdates, self.hdates)
+            self._hdates_cache = None
+            self._hdates_array_cache = None
+            self._hdate_index_cache = None
+
+    @property
+    def hdates_array(self):
+        """获取HistoryPanel的历史日期时间戳ndarray，用于在日期上进行searchsorted等数组操作"""
+        if self._hdates_array_cache is not None:
+            return self._hdates_array_cache
+        if self._is_empty:
+            return 0
+        self._hdates_array_cache = np.array(self.hdates)
+        return self._hdates_array_cache
+
+    @property
+    def _hdate_index(self):
+        """HistoryPanel的历史日期时间戳DatetimeIndex，以int64保存日期，用于在日期上快速进行二分查找"""
+        if self._hdate_index_cache is None:
+            self._hdate_index_cache = pd.DatetimeIndex(self.hdates)
+        return self._hdate_index_cache
+
+    @property
+    def _share_index(self):
+        """HistoryPanel的股票代码Index，生成DataFrame时作为行或列标签，所有DataFrame共用同一个Index对象"""
+        if self._share_index_cache is None:
+            self._share_index_cache = pd.Index(self.shares)
+        return self._share_index_cache
+
+    @property
+    def _htype_index(self):
+        """HistoryPanel的历史数据类型Index，生成DataFrame时作为列标签，所有DataFrame共用同一个Index对象"""
+        if self._htype_index_cache is None:
+            self._htype_index_cache = pd.Index(self.htypes)
+        return self._htype_index_cache
 
     @property
     def row_count(self):
@@ -306,10 +401,12 @@ class HistoryPanel():
     @property
     def htypes(self):
         """获取HistoryPanel的历史数据类型列表"""
-        if self.is_empty:
+        if self._htypes_cache is not None:
+            return self._htypes_cache
+        if self._is_empty:
             return 0
-        else:
-            return list(self._columns.keys())
+        self._htypes_cache = list(self._columns.keys())
+        return self._htypes_cache
 
     @htypes.setter
     def htypes(self, input_htypes: [str, list]):
@@ -322,6 +419,8 @@ class HistoryPanel():
                     f'ValueError, the number of input shares ({len(input_htypes)}) does not match level ' \
                     f'count ({self.column_count})'
                 self._columns = labels_to_dict(input_htypes, self.htypes)
+                self._htypes_cache = None
+                self._htype_index_cache = None
             else:
                 raise TypeError(f'Expect string or list as input htypes, got {type(input_htypes)} instead')
 
@@ -529,7 +628,20 @@ class HistoryPanel():
             share_slice = list_or_slice(share_slice, self.levels)
             hdate_slice = list_or_slice(hdate_slice, self.rows)
 
-            return self.values[share_slice][:, hdate_slice][:, :, htype_slice]
+            indexers = (share_slice, hdate_slice, htype_slice)
+            if any(indexer is None for indexer in indexers):
+                return self.values[share_slice][:, hdate_slice][:, :, htype_slice]
+
+            # 先用切片做基本索引得到视图，不复制数据，再对剩余的列表轴只做一次高级索引，避免生成中间副本
+            view = self.values[tuple(idx if isinstance(idx, slice) else slice(None) for idx in indexers)]
+            fancy_axes = [axis for axis, idx in enumerate(indexers) if not isinstance(idx, slice)]
+            if not fancy_axes:
+                return view
+            if len(fancy_axes) == 1:
+                axis = fancy_axes[0]
+                return view[(slice(None),) * axis + (indexers[axis],)]
+            return view[np.ix_(*(np.arange(view.shape[axis]) if isinstance(idx, slice) else idx
+                                 for axis, idx in enumerate(indexers)))]
 
     def __str__(self):
         """打印HistoryPanel"""
@@ -537,25 +649,84 @@ class HistoryPanel():
         if self.is_empty:
             res.append(f'{type(self)} \nEmpty History Panel at {hex(id(self))}')
         else:
+            # 所有股票显示的日期行都相同，只需确定一次显示的行及其日期标签
+            row_pos, row_index = self._display_rows()
             if self.level_count <= 7:
                 display_shares = self.shares
             else:
                 display_shares = self.shares[0:3]
             for share in display_shares:
                 res.append(f'\nshare {self.levels[share]}, label: {share}\n')
-                df = self.slice_to_dataframe(share=share)
-                res.append(df.__str__())
+                res.append(self._share_to_str(share, row_pos, row_index))
                 res.append('\n')
             if self.level_count > 7:
                 res.append('\n ...  \n')
                 for share in self.shares[-2:]:
                     res.append(f'\nshare {self.levels[share]}, label: {share}\n')
-                    df = self.slice_to_dataframe(share=share)
-                    res.append(df.__str__())
+                    res.append(self._share_to_str(share, row_pos, row_index))
                     res.append('\n')
                 res.append('Only first 3 and last 3 shares are displayed\n')
         return ''.join(res)
 
+    def _display_rows(self):
+        """ 确定打印HistoryPanel时需要生成DataFrame的行
+
+        行数超过pandas的最大显示行数时，pandas只会显示首尾的少数几行，此时只取首尾各一部分行生成DataFrame，
+        截取的行数保证DataFrame仍然超过最大显示行数，因此显示出来的行与完整的DataFrame相同
+
+        Returns
+        -------
+        tuple: (slice or ndarray, DatetimeIndex)
+            需要显示的行序号以及这些行的日期标签
+        """
+        max_rows = pd.get_option('display.max_rows')
+        if (not max_rows) or (self.row_count <= max_rows + 2):
+            return slice(None), self._hdate_index
+        half_rows = max_rows // 2 + 1
+        row_pos = np.r_[0:half_rows, self.row_count - half_rows:self.row_count]
+        return row_pos, self._hdate_index[row_pos]
+
+    def _share_to_str(self, share, row_pos, row_index) -> str:
+        """ 生成一个share的数据的打印字符串
+
+        Parameters
+        ----------
+        share: str
+            股票代码
+        row_pos: slice or ndarray
+            需要显示的行序号，由_display_rows()生成
+        row_index: DatetimeIndex
+            需要显示的行的日期标签，由_display_rows()生成
+
+        Returns
+        -------
+        str
+        """
+        df = pd.DataFrame(self._values[self._levels[share], row_pos, :],
+                          index=row_index,
+                          columns=self._htype_index,
+                          copy=False)
+        if len(df) == self.row_count:
+            return df.__str__()
+
+        # DataFrame只包含首尾部分行，pandas显示的行数是截取后的行数，因此按pandas的显示设置生成字符串时
+        # 不显示行列数，而是在末尾添加HistoryPanel实际的行列数
+        if pd.get_option('display.expand_frame_repr'):
+            line_width = pd.get_option('display.width')
+        else:
+            line_width = None
+        df_str = df.to_string(
+                max_rows=pd.get_option('display.max_rows'),
+                min_rows=pd.get_option('display.min_rows'),
+                max_cols=pd.get_option('display.max_columns'),
+                max_colwidth=pd.get_option('display.max_colwidth'),
+                line_width=line_width,
+                show_dimensions=False,
+        )
+        if pd.get_option('display.show_dimensions'):
+            df_str += f'\n\n[{self.row_count} rows x {self.column_count} columns]'
+        return df_str
+
     def __repr__(self):
         return self.__str__()
 
@@ -630,18 +801,16 @@ class HistoryPanel():
         2015-01-09    10    20   30     40      50
         2015-01-10    10    20   30     40      50
         """
-        hdates = np.array(self.hdates)
-        if start_date is None:
-            start_date = hdates[0]
-        if end_date is None:
-            end_date = hdates[-1]
-        sd = pd.to_datetime(start_date)
-        ed = pd.to_datetime(end_date)
-        sd_index = hdates.searchsorted(sd)
-        ed_index = hdates.searchsorted(ed, side='right')
-        new_dates = list(hdates[sd_index:ed_index])
-        new_values = self[:, :, sd_index:ed_index]
-        return HistoryPanel(new_values, levels=self.shares, rows=new_dates, columns=self.htypes)
+        if self.is_empty:
+            return HistoryPanel()
+        hdate_index = self._hdate_index
+        sd_index = None
+        ed_index = None
+        if start_date is not None:
+            sd_index = hdate_index.searchsorted(pd.to_datetime(start_date))
+        if end_date is not None:
+            ed_index = hdate_index.searchsorted(pd.to_datetime(end_date), side='right')
+        return self.isegment(sd_index, ed_index)
 
     def isegment(self, start_index=None, end_index=None):
         """ 获取HistoryPanel的一个片段，start_index和end_index都是int数，表示日期序号，返回
@@ -683,10 +852,15 @@ class HistoryPanel():
         2015-01-08    10    20   30     40      50
         2015-01-09    10    20   30     40      50
         """
-        hdates = np.array(self.hdates)
-        new_dates = list(hdates[start_index:end_index])
+        if self.is_empty:
+            return HistoryPanel()
+        new_dates = self.hdates[start_index:end_index]
         new_values = self[:, :, start_index:end_index]
-        return HistoryPanel(new_values, levels=self.shares, rows=new_dates, columns=self.htypes)
+        if new_values.size == 0:
+            return HistoryPanel()
+        # 层标签和列标签不变，直接复用，日期标签已经是Timestamp，直接按顺序编号，无需重新解析
+        new_rows = dict(zip(new_dates, range(len(new_dates))))
+        return HistoryPanel._from_internals(new_values, self._levels.copy(), new_rows, self._columns.copy())
 
     def slice(self, shares=None, htypes=None):
         """ 获取HistoryPanel的一个股票或数据种类片段，shares和htypes可以为列表或逗号分隔字符
@@ -727,7 +901,10 @@ class HistoryPanel():
         if not isinstance(htypes, list):
             raise KeyError(f'wrong htypes are given!')
         new_values = self[htypes, shares]
-        return HistoryPanel(new_values, levels=shares, columns=htypes, rows=self.hdates)
+        return HistoryPanel._from_internals(new_values,
+                                            labels_to_dict(shares, range(len(shares))),
+                                            self._rows.copy(),
+                                            labels_to_dict(htypes, range(len(htypes))))
 
     def info(self):
         """ 打印本HistoryPanel对象的信息
@@ -775,7 +952,7 @@ class HistoryPanel():
                 print(f'{self.shares}')
             else:
                 print(f'{self.shares[0:3]} ... {self.shares[-3:-1]}')
-            sum_nnan = np.sum(~np.isnan(self.values), 1)
+            sum_nnan = count_non_nan_3d_data(self.values)
             df = pd.DataFrame(sum_nnan, index=self.shares, columns=self.htypes)
             print('non-null values for each share and data type:')
             print(df)
@@ -784,7 +961,9 @@ class HistoryPanel():
     def copy(self):
         """ 返回一个新的HistoryPanel对象，其值和本对象相同"""
         # TODO: 应该考虑使用copy模块的copy(deep=True)代替下面的代码
-        return HistoryPanel(values=self.values, levels=self.levels, rows=self.rows, columns=self.columns)
+        if self.is_empty:
+            return HistoryPanel()
+        return HistoryPanel._from_internals(self.values, self._levels.copy(), self._rows.copy(), self._columns.copy())
 
     def len(self):
         """ 返回HistoryPanel对象的长度，即日期个数
@@ -889,6 +1068,8 @@ class HistoryPanel():
         out : HistoryPanel, 填充后的HistoryPanel对象
         """
         if not self.is_empty:
+            if not has_nan_3d_data(self._values):
+                return self
             self._values = fill_nan_data(self._values, with_val)
         return self
 
@@ -905,6 +1086,8 @@ class HistoryPanel():
         out : HistoryPanel, 填充后的HistoryPanel对象
         """
         if not self.is_empty:
+            if not np.isinf(self._values).any():
+                return self
             self._values = fill_inf_data(self._values, with_val)
         return self
 
@@ -958,7 +1141,7 @@ class HistoryPanel():
 
         if not self.is_empty:
             val = self.values
-            if np.all(~np.isnan(val)):
+            if not has_nan_3d_data(val):
                 return self
             self._values = ffill_3d_data(val, init_val)
         return self
@@ -1053,62 +1236,48 @@ class HistoryPanel():
             this_shares = self.shares
             this_htypes = self.htypes
             this_hdates = self.hdates
+            # 合并标签时直接在数组上排序合并，得到已经排序的标签，不再生成Python集合后再排序
             if not same_shares:
-                combined_shares = list(set(this_shares).union(set(other_shares)))
-                combined_shares.sort()
+                combined_shares = np.union1d(this_shares, other_shares).tolist()
             else:
                 assert this_shares == other_shares, f'Assertion Error, shares of two HistoryPanels are different!'
                 combined_shares = self.shares
             if not same_htypes:
-                combined_htypes = list(set(this_htypes).union(set(other_htypes)))
-                combined_htypes.sort()
+                combined_htypes_arr = np.union1d(this_htypes, other_htypes)
+                combined_htypes = combined_htypes_arr.tolist()
             else:
                 assert this_htypes == other_htypes, f'Assertion Error, htypes of two HistoryPanels are different!'
                 combined_htypes = self.htypes
             if not same_hdates:
-                combined_hdates = list(set(this_hdates).union(set(other_hdates)))
-                combined_hdates.sort()
+                this_hdate_index = pd.DatetimeIndex(this_hdates)
+                other_hdate_index = pd.DatetimeIndex(other_hdates)
+                combined_hdates = this_hdate_index.union(other_hdate_index).sort_values()
             else:
                 assert this_hdates == other_hdates, f'Assertion Error, hdates of two HistoryPanels are different!'
                 combined_hdates = self.hdates
-            combined_values = np.empty(shape=(len(combined_shares),
-                                              len(combined_hdates),
-                                              len(combined_htypes)))
-            combined_values.fill(fill_value)
+            # 合并后的数据直接作为新HistoryPanel的values，因此每次都需要新分配内存，不能复用缓冲区
+            combined_values = np.full(shape=(len(combined_shares),
+                                             len(combined_hdates),
+                                             len(combined_htypes)),
+                                      fill_value=fill_value,
+                                      dtype='float')
             if same_shares:
+                # 预先计算this和other的hdates与htypes在合并后的HistoryPanel中的位置，然后整块赋值，
+                # 先写入other的数据，再写入this的数据，使两者标签重叠时保留this的数据
+                # 标签相同时位置就是顺序号，否则合并后的标签已经排序，用searchsorted一次性查出所有位置
+                if same_hdates:
+                    this_hdate_pos = other_hdate_pos = np.arange(len(combined_hdates))
+                else:
+                    this_hdate_pos = combined_hdates.searchsorted(this_hdate_index)
+                    other_hdate_pos = combined_hdates.searchsorted(other_hdate_index)
                 if same_htypes:
-                    for hdate in combined_hdates:
-                        combined_hdate_id = labels_to_dict(combined_hdates, combined_hdates)
-                        this_hdate_id = labels_to_dict(this_hdates, this_hdates)
-                        other_hdate_id = labels_to_dict(other_hdates, other_hdates)
-                        if hdate in this_hdates:
-                            combined_values[:, combined_hdate_id[hdate], :] = self.values[:, this_hdate_id[hdate], :]
-                        else:
-                            combined_values[:, combined_hdate_id[hdate], :] = other.values[:, other_hdate_id[hdate], :]
-                elif same_hdates:
-                    for htype in combined_htypes:
-                        combined_htype_id = labels_to_dict(combined_htypes, combined_htypes)
-                        this_htype_id = labels_to_dict(this_htypes, this_htypes)
-                        other_htype_id = labels_to_dict(other_htypes, other_htypes)
-                        if htype in this_htypes:
-                            combined_values[:, :, combined_htype_id[htype]] = self.values[:, :, this_htype_id[htype]]
-                        else:
-                            combined_values[:, :, combined_htype_id[htype]] = other.values[:, :, other_htype_id[htype]]
+                    this_htype_pos = other_htype_pos = np.arange(len(combined_htypes))
                 else:
-                    for hdate in combined_hdates:
-                        for htype in combined_htypes:
-                            combined_hdate_id = labels_to_dict(combined_hdates, combined_hdates)
-                            this_hdate_id = labels_to_dict(this_hdates, this_hdates)
-                            other_hdate_id = labels_to_dict(other_hdates, other_hdates)
-                            combined_htype_id = labels_to_dict(combined_htypes, combined_htypes)
-                            this_htype_id = labels_to_dict(this_htypes, this_htypes)
-                            other_htype_id = labels_to_dict(other_htypes, other_htypes)
-                            if htype in this_htypes and hdate in this_hdates:
-                                combined_values[:, combined_hdate_id[hdate], combined_htype_id[htype]] = \
-                                    self.values[:, this_hdate_id[hdate], this_htype_id[htype]]
-                            elif htype in other_htypes and hdate in other_hdates:
-                                combined_values[:, combined_hdate_id[hdate], combined_htype_id[htype]] = \
-                                    other.values[:, other_hdate_id[hdate], other_htype_id[htype]]
+                    this_htype_pos = np.searchsorted(combined_htypes_arr, np.asarray(this_htypes))
+                    other_htype_pos = np.searchsorted(combined_htypes_arr, np.asarray(other_htypes))
+                all_shares = np.arange(len(combined_shares))
+                combined_values[np.ix_(all_shares, other_hdate_pos, other_htype_pos)] = other.values
+                combined_values[np.ix_(all_shares, this_hdate_pos, this_htype_pos)] = self.values
             # TODO: implement this section 实现相同htype的HistoryPanel合并
             elif same_htypes:
                 raise NotImplementedError
@@ -1141,7 +1310,9 @@ class HistoryPanel():
         if not self.is_empty:
             assert isinstance(dtype, str), f'InputError, dtype should be a string, got {type(dtype)}'
             assert dtype in ALL_DTYPES, f'data type {dtype} is not recognized or not supported!'
-            self._values = self.values.astype(dtype)
+            # 数据类型已经相同时不做转换，避免复制整个数组
+            if self.values.dtype != np.dtype(dtype):
+                self._values = self.values.astype(dtype, copy=False)
         return self
 
     def slice_to_dataframe(self,
@@ -1172,6 +1343,8 @@ class HistoryPanel():
         Returns
         -------
         pandas.DataFrame
+            不去除NaN值时，DataFrame的数据直接使用HistoryPanel中数据的视图，不复制数据，
+            因此直接修改DataFrame中的数据会同时改变HistoryPanel中的数据
 
         Examples
         --------
@@ -1219,10 +1392,9 @@ class HistoryPanel():
                 htype = self.htypes[htype]
             if not htype in self.htypes:
                 raise KeyError(f'htype {htype} is not found!')
-            # 在生成DataFrame之前，需要把数据降低一个维度，例如shape(1, 24, 5) -> shape(24, 5)
-            v = self[htype].T
-            v = v.reshape(v.shape[-2:])
-            res_df = pd.DataFrame(v, index=self.hdates, columns=self.shares)
+            # 直接用整数索引取出二维切片，这是self.values的视图，不复制数据
+            v = self._values[:, :, self._columns[htype]].T
+            res_df = pd.DataFrame(v, index=self._hdate_index, columns=self._share_index, copy=False)
 
         if share is not None:
             assert isinstance(share, (str, int)), f'share must be a string or an integer, got {type(share)}'
@@ -1230,14 +1402,13 @@ class HistoryPanel():
                 share = self.shares[share]
             if not share in self.shares:
                 raise KeyError(f'share {share} is not found!')
-            # 在生成DataFrame之前，需要把数据降低一个维度，例如shape(1, 24, 5) -> shape(24, 5)
-            v = self[:, share]
-            v = v.reshape(v.shape[-2:])
-            res_df = pd.DataFrame(v, index=self.hdates, columns=self.htypes)
+            v = self._values[self._levels[share]]
+            res_df = pd.DataFrame(v, index=self._hdate_index, columns=self._htype_index, copy=False)
 
         if dropna and inf_as_na:
-            with pd.option_context('mode.use_inf_as_na', True):
-                return res_df.dropna(how='all')
+            # 只去掉全部为NaN或inf的行，保留行中的inf值不变，与pandas中use_inf_as_na选项下的dropna结果相同
+            # 不修改pandas的全局设置，也不修改数据
+            return res_df.loc[np.isfinite(res_df.to_numpy(dtype='float')).any(axis=1)]
         if dropna:
             return res_df.dropna(how='all')
 
@@ -1483,15 +1654,56 @@ class HistoryPanel():
         if self.is_empty:
             return df_dict
 
+        # 所有DataFrame共用同一组行、列标签Index对象，直接从values的切片生成，不逐个调用slice_to_dataframe
+        hdate_index = self._hdate_index
         if by.lower() in ['share', 'shares']:
-            for share in self.shares:
-                df_dict[share] = self.slice_to_dataframe(share=share)
-            return df_dict
+            htype_index = self._htype_index
+            values = self._values
+            return {share: pd.DataFrame(values[i], index=hdate_index, columns=htype_index, copy=False)
+                    for i, share in enumerate(self.shares)}
 
         if by.lower() in ['htype', 'htypes']:
-            for htype in self.htypes:
-                df_dict[htype] = self.slice_to_dataframe(htype=htype)
-            return df_dict
+            share_index = self._share_index
+            # 一次性转置为(C, L, R)的连续数组，每个htype的数据在内存中连续存储
+            values = np.ascontiguousarray(self._values.transpose(2, 0, 1))
+            return {htype: pd.DataFrame(values[i].T, index=hdate_index, columns=share_index, copy=False)
+                    for i, htype in enumerate(self.htypes)}
+
+    def to_htype_arrays(self, dtype=None) -> dict:
+        """ 将HistoryPanel按历史数据类型拆分为若干个二维数组，返回一个dict，keys是历史数据类型，
+            values是该数据类型所有股票所有日期的数据，shape为(L, R)
+
+        HistoryPanel的数据按照(L, R, C)的顺序存储，同一股票同一数据类型在不同日期的数据在内存中并不连续，
+        拆分后的每个数组都是C-contiguous的，同一股票的数据沿日期连续存储，适合按时间序列逐行计算的场合。
+        生成的数组是HistoryPanel数据的副本，修改它们不会改变HistoryPanel
+
+        Parameters
+        ----------
+        dtype: str or np.dtype, optional
+            生成数组的数据类型，如'float32'，默认与HistoryPanel的数据类型相同
+
+        Returns
+        -------
+        dict, {str: ndarray}
+
+        Examples
+        --------
+        >>> hp = HistoryPanel(np.arange(12).reshape(2, 3, 2),
+        ...                   rows=['2020-01-01', '2020-01-02', '2020-01-03'],
+        ...                   levels=['000001', '000002'],
+        ...                   columns=['close', 'open'])
+        >>> hp.to_htype_arrays()
+        {'close': array([[ 0,  2,  4],
+                         [ 6,  8, 10]]),
+         'open': array([[ 1,  3,  5],
+                        [ 7,  9, 11]])}
+        """
+        if self.is_empty:
+            return {}
+        if dtype is None:
+            dtype = self._values.dtype
+        return {htype: np.ascontiguousarray(self._values[:, :, col], dtype=dtype)
+                for htype, col in self._columns.items()}
 
     def unstack(self, by: str = 'share') -> dict:
         """ 等同于方法self.to_df_dict(), 是方法self.to_df_dict()的别称
@@ -1833,6 +2045,31 @@ class HistoryPanel():
         raise NotImplementedError
 
 
+def _to_timestamp_list(dates) -> list:
+    """ 将一组日期转化为pd.Timestamp列表，用于生成HistoryPanel的行标签
+
+    DatetimeIndex直接转化为列表，不再重新解析；其他输入首先尝试一次性批量转换，
+    若各元素格式不一致导致批量转换失败，则退回逐个转换
+
+    Parameters
+    ----------
+    dates: list, dict or DatetimeIndex
+        需要转换的日期，如果是dict则转换其键
+
+    Returns
+    -------
+    list of pd.Timestamp
+    """
+    if isinstance(dates, pd.DatetimeIndex):
+        return dates.tolist()
+    if isinstance(dates, dict):
+        dates = list(dates)
+    try:
+        return pd.DatetimeIndex(pd.to_datetime(dates)).tolist()
+    except (ValueError, TypeError):
+        return [pd.to_datetime(date) for date in dates]
+
+
 def hp_join(*historypanels):
     """ 当元组*historypanels不是None，且内容全都是HistoryPanel对象时，将所有的HistoryPanel对象连接成一个HistoryPanel
 
@@ -1845,14 +2082,44 @@ def hp_join(*historypanels):
     -------
     HistoryPanel
         组合后的HistoryPanel
+
+    Notes
+    -----
+    与逐个调用HistoryPanel.join()的结果相同：如果多个HistoryPanel中包含标签相同的数据，保留排在前面的HistoryPanel的数据。
+    所有标签的并集一次性求出，结果数组只分配一次，每个HistoryPanel的数据只复制一次
     """
     assert all(isinstance(hp, HistoryPanel) for hp in historypanels), \
         f'Object type Error, all objects passed to this function should be HistoryPanel'
-    res_hp = HistoryPanel()
-    for hp in historypanels:
-        if isinstance(hp, HistoryPanel):
-            res_hp.join(other=hp)
-    return res_hp
+    historypanels = [hp for hp in historypanels if not hp.is_empty]
+    if len(historypanels) == 0:
+        return HistoryPanel()
+    if len(historypanels) == 1:
+        # 与合并多个HistoryPanel时一样返回一个新的HistoryPanel对象，而不是输入的对象本身
+        return historypanels[0].copy()
+
+    combined_shares = np.unique(np.concatenate([np.asarray(hp.shares) for hp in historypanels]))
+    combined_htypes = np.unique(np.concatenate([np.asarray(hp.htypes) for hp in historypanels]))
+    hdate_indexes = [pd.DatetimeIndex(hp.hdates) for hp in historypanels]
+    combined_hdates = hdate_indexes[0]
+    for hdate_index in hdate_indexes[1:]:
+        combined_hdates = combined_hdates.union(hdate_index)
+    combined_hdates = combined_hdates.sort_values()
+
+    combined_values = np.full(shape=(len(combined_shares), len(combined_hdates), len(combined_htypes)),
+                              fill_value=np.nan,
+                              dtype='float')
+    # 合并后的标签已经排序，用searchsorted一次性查出每个HistoryPanel的标签位置，
+    # 倒序写入数据，使标签重叠时排在前面的HistoryPanel的数据覆盖后面的数据
+    for hp, hdate_index in zip(reversed(historypanels), reversed(hdate_indexes)):
+        share_pos = np.searchsorted(combined_shares, np.asarray(hp.shares))
+        hdate_pos = combined_hdates.searchsorted(hdate_index)
+        htype_pos = np.searchsorted(combined_htypes, np.asarray(hp.htypes))
+        combined_values[np.ix_(share_pos, hdate_pos, htype_pos)] = hp.values
+
+    return HistoryPanel(values=combined_values,
+                        levels=combined_shares.tolist(),
+                        rows=combined_hdates,
+                        columns=combined_htypes.tolist())
 
 
 def dataframe_to_hp(
@@ -1860,7 +2127,8 @@ def dataframe_to_hp(
         hdates=None,
         htypes=None,
         shares=None,
-        column_type: str = None
+        column_type: str = None,
+        dtype=None
 ):
     """ 根据DataFrame中的数据创建HistoryPanel对象。
 
@@ -1877,6 +2145,9 @@ def dataframe_to_hp(
     column_type: str, Default None
         DataFrame的column代表的数据类型，可以为 'shares' or 'htype'
         如果为None，则必须输入htypes和shares参数中的一个
+    dtype: str or np.dtype, Default None
+        生成的HistoryPanel的数据类型，例如'float32'。如果为None，column_type为'shares'时转换为float64，
+        为'htypes'时保留DataFrame原有的数据类型
 
     Returns
     -------
@@ -1936,7 +2207,10 @@ def dataframe_to_hp(
         msg = f'Input df should be pandas DataFrame! got {type(df)} instead.'
         raise TypeError(msg)
     if hdates is None:
-        hdates = df.rename(index=pd.to_datetime).index
+        # 索引已经是DatetimeIndex时直接使用，否则批量转换，避免逐个标签调用pd.to_datetime
+        hdates = df.index
+        if not isinstance(hdates, pd.DatetimeIndex):
+            hdates = pd.DatetimeIndex(_to_timestamp_list(hdates))
     # if not isinstance(hdates, (list, tuple)):
     #     msg = f'TypeError, hdates should be list or tuple, got {type(hdates)} instead.'
     #     raise TypeError(msg)
@@ -1990,9 +2264,9 @@ def dataframe_to_hp(
         assert isinstance(htypes, str), \
             f'TypeError, data type of dtype should be a string, got {type(htypes)} instead.'
         share_count = len(shares)
-        history_panel_value = np.zeros(shape=(share_count, len(hdates), 1))
-        for i in range(share_count):
-            history_panel_value[i, :, 0] = df.values[:, i]
+        # DataFrame的每一列是一个share，转置后整块复制为(share_count, len(hdates), 1)的数组
+        history_panel_value = np.ascontiguousarray(df.to_numpy(dtype='float' if dtype is None else dtype).T)
+        history_panel_value = history_panel_value.reshape(share_count, len(hdates), 1)
     else:  # column_type == 'htype'
         if htypes is None:
             htypes = df.columns
@@ -2008,7 +2282,7 @@ def dataframe_to_hp(
         assert shares is not None, f'InputError, shares should be given when they can not inferred'
         assert isinstance(shares, str), \
             f'TypeError, data type of share should be a string, got {type(shares)} instead.'
-        history_panel_value = df.values.reshape(1, len(hdates), len(htypes))
+        history_panel_value = np.ascontiguousarray(df.to_numpy(dtype=dtype)).reshape(1, len(hdates), len(htypes))
     return HistoryPanel(values=history_panel_value, levels=shares, rows=hdates, columns=htypes)
 
 
@@ -2016,13 +2290,15 @@ def from_single_dataframe(df: pd.DataFrame,
                           hdates=None,
                           htypes=None,
                           shares=None,
-                          column_type: str = None) -> HistoryPanel:
+                          column_type: str = None,
+                          dtype=None) -> HistoryPanel:
     """ 函数dataframe_to_hp()的别称，等同于dataframe_to_hp()"""
     return dataframe_to_hp(df=df,
                            hdates=hdates,
                            htypes=htypes,
                            shares=shares,
-                           column_type=column_type)
+                           column_type=column_type,
+                           dtype=dtype)
 
 
 def from_multi_index_dataframe(df: pd.DataFrame):
@@ -2041,7 +2317,51 @@ def from_multi_index_dataframe(df: pd.DataFrame):
     raise NotImplementedError
 
 
-def stack_dataframes(dfs: [list, dict], dataframe_as: str = 'shares', shares=None, htypes=None, fill_value=None):
+@njit()
+def _scatter_df_values(res_values, df_id, src_values, row_pos, col_pos, as_shares):
+    """ 将一个DataFrame的数据写入stack_dataframes()生成的三维数组中
+
+    DataFrame中没有的列保持res_values中原有的填充值，结果中有而DataFrame中没有的日期被写为NaN，
+    DataFrame中多余的列（col_pos为-1）被丢弃
+
+    Parameters
+    ----------
+    res_values: 3D ndarray
+        需要写入的三维数组，shape为(share_count, index_count, htype_count)
+    df_id: int
+        DataFrame的序号，as_shares为True时是层序号，否则是列序号
+    src_values: 2D ndarray
+        DataFrame的数据
+    row_pos: 1D ndarray of int
+        DataFrame每一行在res_values中的行号
+    col_pos: 1D ndarray of int
+        DataFrame每一列在res_values中的层号或列号，-1表示该列不需要写入
+    as_shares: bool
+        True表示每个DataFrame代表一个share，其列代表htype，否则每个DataFrame代表一个htype，其列代表share
+
+    Returns
+    -------
+    None
+    """
+    index_count = res_values.shape[1]
+    for j in range(col_pos.shape[0]):
+        target = col_pos[j]
+        if target < 0:
+            continue
+        if as_shares:
+            for i in range(index_count):
+                res_values[df_id, i, target] = np.nan
+            for i in range(row_pos.shape[0]):
+                res_values[df_id, row_pos[i], target] = src_values[i, j]
+        else:
+            for i in range(index_count):
+                res_values[target, i, df_id] = np.nan
+            for i in range(row_pos.shape[0]):
+                res_values[target, row_pos[i], df_id] = src_values[i, j]
+
+
+def stack_dataframes(dfs: [list, dict], dataframe_as: str = 'shares', shares=None, htypes=None, fill_value=None,
+                     dtype='float'):
     """ 将多个dataframe组合成一个HistoryPanel.
 
     Parameters
@@ -2089,6 +2409,9 @@ def stack_dataframes(dfs: [list, dict], dataframe_as: str = 'shares', shares=Non
         多余的DataFrame数据会被丢弃
     fill_value:
         多余的位置用fill_value填充
+    dtype: str or np.dtype, Default 'float'
+        生成的HistoryPanel的数据类型，必须是浮点数类型，默认float64。价格、成交量等数据可以使用'float32'，
+        以减少一半的内存占用
 
     Returns
     -------
@@ -2124,13 +2447,13 @@ def stack_dataframes(dfs: [list, dict], dataframe_as: str = 'shares', shares=Non
     if fill_value is None:
         fill_value = np.nan
     assert isinstance(fill_value, (int, float)), f'invalid fill value type {type(fill_value)}'
+    assert np.issubdtype(np.dtype(dtype), np.floating), f'dtype should be a float data type, got {dtype} instead'
     if shares is not None:
         if isinstance(shares, str):
-            shares = str_to_list(shares)
+            shares = cached_str_to_list(shares)
     if htypes is not None:
         if isinstance(htypes, str):
-            htypes = str_to_list(htypes)
-    combined_index = []
+            htypes = cached_str_to_list(htypes)
     combined_shares = []
     combined_htypes = []
     # 检查输入参数是否正确
@@ -2154,62 +2477,61 @@ def stack_dataframes(dfs: [list, dict], dataframe_as: str = 'shares', shares=Non
     if isinstance(dfs, dict):
         dfs = dfs.values()
     # 逐个处理所有传入的DataFram，合并index、htypes以及shares
+    # 日期标签使用DatetimeIndex逐个合并，合并结果自动排序去重，不需要在Python中对Timestamp对象做集合运算
+    # 每个DataFrame的日期标签只转换一次，已经是DatetimeIndex的不再转换
+    combined_index = pd.DatetimeIndex([])
+    df_columns = []
+    datetime_dfs = []
     for df in dfs:
         assert isinstance(df, pd.DataFrame), \
             f'InputError, dfs should be a list of pandas DataFrame, got {type(df)} instead.'
-        combined_index.extend(df.rename(index=pd.to_datetime).index)
-        if dataframe_as == 'shares':
-            combined_htypes.extend(df.columns)
-        else:
-            combined_shares.extend(df.columns)
-    dfs = [df.rename(index=pd.to_datetime) for df in dfs]
+        if not isinstance(df.index, pd.DatetimeIndex):
+            df = df.set_axis(pd.DatetimeIndex(_to_timestamp_list(df.index)), axis=0)
+        combined_index = combined_index.union(df.index)
+        df_columns.append(df.columns)
+        datetime_dfs.append(df)
+    dfs = datetime_dfs
     # 合并htypes及shares，
     # 如果没有直接给出shares或htypes，使用他们的并集并排序
     # 如果直接给出了shares或htypes，直接使用并保持原始顺序
     if (dataframe_as == 'shares') and (htypes is None):
-        combined_htypes = list(set(combined_htypes))
-        combined_htypes.sort()
+        combined_htypes = pd.Index([]).append(df_columns).unique().sort_values().tolist()
     elif (dataframe_as == 'shares') and (htypes is not None):
         combined_htypes = htypes
     elif (dataframe_as == 'htypes') and (shares is None):
-        combined_shares = list(set(combined_shares))
-        combined_shares.sort()
+        combined_shares = pd.Index([]).append(df_columns).unique().sort_values().tolist()
     elif (dataframe_as == 'htypes') and (shares is not None):
         combined_shares = shares
-    combined_index = list(set(combined_index))
     htype_count = len(combined_htypes)
     share_count = len(combined_shares)
     index_count = len(combined_index)
-    combined_htypes_dict = dict(zip(combined_htypes, range(htype_count)))
-    combined_shares_dict = dict(zip(combined_shares, range(share_count)))
-    combined_index.sort()
     # 生成并复制数据
-    res_values = np.zeros(shape=(share_count, index_count, htype_count))
-    res_values.fill(fill_value)
+    res_values = np.full(shape=(share_count, index_count, htype_count), fill_value=fill_value, dtype=dtype)
+    target_columns = pd.Index(combined_htypes if dataframe_as == 'shares' else combined_shares)
     for df_id in range(len(dfs)):
-        extended_df = dfs[df_id].reindex(combined_index)
-        for col_name, series in extended_df.items():  # iteritems is deprecated since 1.5 and removed since 2.0
-            if dataframe_as == 'shares':
-                if col_name not in combined_htypes_dict:
-                    continue
-                res_values[df_id, :, combined_htypes_dict[col_name]] = series.values
-            else:
-                if col_name not in combined_shares_dict:
-                    continue
-                res_values[combined_shares_dict[col_name], :, df_id] = series.values
+        # 用get_indexer一次性查出DataFrame每一行、每一列在结果中的位置，再由_scatter_df_values逐个写入
+        df = dfs[df_id]
+        _scatter_df_values(res_values,
+                           df_id,
+                           df.to_numpy(dtype=dtype),
+                           combined_index.get_indexer(df.index),
+                           target_columns.get_indexer(df.columns),
+                           dataframe_as == 'shares')
     return HistoryPanel(res_values,
                         levels=combined_shares,
                         rows=combined_index,
                         columns=combined_htypes)
 
 
-def from_df_dict(dfs: [list, dict], dataframe_as: str = 'shares', shares=None, htypes=None, fill_value=None):
+def from_df_dict(dfs: [list, dict], dataframe_as: str = 'shares', shares=None, htypes=None, fill_value=None,
+                 dtype='float'):
     """ 函数stack_dataframes()的别称，等同于函数stack_dataframes()"""
     return stack_dataframes(dfs=dfs,
                             dataframe_as=dataframe_as,
                             shares=shares,
                             htypes=htypes,
-                            fill_value=fill_value)
+                            fill_value=fill_value,
+                            dtype=dtype)
 
 
 def _adjust_freq(hist_data: pd.DataFrame,
@@ -2220,6 +2542,7 @@ def _adjust_freq(hist_data: pd.DataFrame,
                  trade_time_only: bool = True,
                  forced_start: str = None,
                  forced_end: str = None,
+                 index_cache: dict = None,
                  **kwargs):
     """ 降低获取数据的频率，通过插值的方式将高频数据降频合并为低频数据，使历史数据的时间频率
     符合target_freq
@@ -2261,6 +2584,9 @@ def _adjust_freq(hist_data: pd.DataFrame,
         强制开始日期，如果为None，则使用hist_data的第一天为开始日期
     forced_start: str, Datetime like, 默认None
         强制结束日期，如果为None，则使用hist_data的最后一天为结束日期
+    index_cache: dict, 默认None
+        用于缓存生成的交易时间序列，以(start, end, freq)为键。多个DataFrame按相同的参数调整频率时传入同一个dict，
+        相同的交易时间序列只需生成一次，**kwargs必须相同
     **kwargs:
         用于生成trade_time_index的参数，包括：
         include_start:   日期时间序列是否包含开始日期/时间
@@ -2386,16 +2712,22 @@ def _adjust_freq(hist_data: pd.DataFrame,
 
     # 如果要求去掉非交易时段的数据
     from qteasy.trading_util import _trade_time_index
-    if trade_time_only:
-        expanded_index = _trade_time_index(
-                start=start,
-                end=end,
-                freq=target_freq,
-                trade_days_only=b_days_only,
-                **kwargs
-        )
+    index_key = (start, end, target_freq)
+    if (index_cache is not None) and (index_key in index_cache):
+        expanded_index = index_cache[index_key]
     else:
-        expanded_index = pd.date_range(start=start, end=end, freq=target_freq)
+        if trade_time_only:
+            expanded_index = _trade_time_index(
+                    start=start,
+                    end=end,
+                    freq=target_freq,
+                    trade_days_only=b_days_only,
+                    **kwargs
+            )
+        else:
+            expanded_index = pd.date_range(start=start, end=end, freq=target_freq)
+        if index_cache is not None:
+            index_cache[index_key] = expanded_index
     resampled = resampled.reindex(index=expanded_index)
     # 如果在数据开始或末尾增加了空数据（因为forced start/forced end），需要根据情况填充
     if (expanded_index[-1] > resampled_index[-1]) or (expanded_index[0] < resampled_index[0]):
@@ -2412,6 +2744,65 @@ def _adjust_freq(hist_data: pd.DataFrame,
 # ==================
 # High level functions that creates HistoryPanel that fits the requirement of trade strategies
 # ==================
+def _process_htype_df(df, htype_freq, *, freq, resample_method, start, end, rows, b_days_only,
+                      trade_time_only, index_cache=None, **kwargs):
+    """ 按照get_history_panel()的设置处理一个htype的DataFrame，调整频率并截取行数
+
+    Parameters
+    ----------
+    df: pd.DataFrame or pd.Series
+        一个htype的历史数据
+    htype_freq: str
+        该htype的数据原本的频率
+    freq: str
+        目标频率
+    index_cache: dict, optional
+        所有htype共用的交易时间序列缓存，传递给_adjust_freq()
+    其余参数的含义与get_history_panel()中的同名参数相同
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    if isinstance(df, pd.Series):
+        df = pd.DataFrame(df)
+        df.columns = ['none']
+    if (not b_days_only) or (not trade_time_only) or (htype_freq != freq):
+        df = _adjust_freq(
+                df,
+                target_freq=freq,
+                method=resample_method,
+                forced_start=start,
+                forced_end=end,
+                b_days_only=b_days_only,
+                trade_time_only=trade_time_only,
+                index_cache=index_cache,
+                **kwargs
+        )
+    if rows is not None:
+        df = df.tail(rows)
+    return df
+
+
+def _drop_all_nan_rows(df):
+    """ 去掉DataFrame中全为NaN的行
+
+    在数组上一次性算出需要保留的行，没有全为NaN的行时直接返回原DataFrame，不再复制
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    keep = ~pd.isna(df.to_numpy()).all(axis=1)
+    if keep.all():
+        return df
+    return df.iloc[keep]
+
+
 def get_history_panel(
         data_types,
         data_source,
@@ -2548,31 +2939,41 @@ def get_history_panel(
     #  1，确保所有的DataFrame都有同样的时间频率，如果时间频率小于日频，输出时间仅包含交易时间内，如果频率为日频，排除周末
     #  2，检查整行NaN值的情况，根据设定去掉或保留这些行
     #  3，如果df是一个Series，则将其转化为DataFrame
-    for htyp, df in all_dfs.items():
-        if isinstance(df, pd.Series):
-            df = pd.DataFrame(df)
-            df.columns = ['none']
-        # find freq of the htyp:
-        htype_freq = [d_type for d_type in data_types if d_type.name == htyp][0]
-        if (not b_days_only) or (not trade_time_only) or (htype_freq.freq != freq):
-            new_df = _adjust_freq(
-                    df,
-                    target_freq=freq,
-                    method=resample_method,
-                    forced_start=start,
-                    forced_end=end,
-                    b_days_only=b_days_only,
-                    trade_time_only=trade_time_only,
-                    **kwargs
-            )
-            df = new_df
-        if rows is not None:
-            assert isinstance(rows, int)
-            assert rows > 0
-            df = df.tail(rows)
-        if drop_nan:
-            df = df.dropna(how='all')
-        all_dfs[htyp] = df
+    if rows is not None:
+        assert isinstance(rows, int)
+        assert rows > 0
+    htype_freqs = {d_type.name: d_type.freq for d_type in data_types}
+    htyps = list(all_dfs.keys())
+    # 所有htype使用相同的参数调整频率，生成的交易时间序列保存在同一个缓存中，相同的序列只生成一次
+    trade_time_index_cache = {}
+    processed_dfs = []
+    for htyp in htyps:
+        processed_dfs.append(_process_htype_df(
+                all_dfs[htyp],
+                htype_freqs[htyp],
+                freq=freq,
+                resample_method=resample_method,
+                start=start,
+                end=end,
+                rows=rows,
+                b_days_only=b_days_only,
+                trade_time_only=trade_time_only,
+                index_cache=trade_time_index_cache,
+                **kwargs
+        ))
+    if drop_nan and processed_dfs:
+        # 所有htype的日期标签相同时（最常见的情况），合并后的HistoryPanel中一行是否全为NaN取决于所有htype，
+        # 因此将所有htype的NaN标记合并为同一个mask，只筛选一次；日期标签不同时分别去掉每个htype中全为NaN的行
+        first_index = processed_dfs[0].index
+        if all(df.index.equals(first_index) for df in processed_dfs[1:]):
+            keep = np.zeros(len(first_index), dtype='bool')
+            for df in processed_dfs:
+                keep |= ~pd.isna(df.to_numpy()).all(axis=1)
+            if not keep.all():
+                processed_dfs = [df.iloc[keep] for df in processed_dfs]
+        else:
+            processed_dfs = [_drop_all_nan_rows(df) for df in processed_dfs]
+    all_dfs = dict(zip(htyps, processed_dfs))
 
     result_hp = stack_dataframes(all_dfs, dataframe_as='htypes', htypes=all_dfs.keys(), shares=shares)
 
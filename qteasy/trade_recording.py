@@ -23,6 +23,30 @@ TIMEZONE = 'Asia/Shanghai'
 
 # TODO: 创建一个模块级变量，用于存储交易信号的数据源，所有的交易信号都从这个数据源中读取
 #  避免交易信号从不同的数据源中获取，导致交易信号的不一致性 ?? 这是不是最好的做法？？
+def _resolve_data_source(data_source) -> DataSource:
+    """ 检查并返回函数使用的数据源，data_source为None时返回默认数据源qt.QT_DATA_SOURCE
+
+    Parameters
+    ----------
+    data_source: DataSource or None
+        函数调用者给出的数据源
+
+    Returns
+    -------
+    DataSource
+
+    Raises
+    ------
+    TypeError: 如果data_source不是DataSource对象
+    """
+    if data_source is None:
+        import qteasy as qt
+        data_source = qt.QT_DATA_SOURCE
+    if not isinstance(data_source, DataSource):
+        raise TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+    return data_source
+
+
 # 9 foundational functions for account and position management
 def new_account(*, user_name, cash_amount, data_source=None, **account_data) -> int:
     """ 创建一个新的账户
@@ -46,17 +70,13 @@ def new_account(*, user_name, cash_amount, data_source=None, **account_data) ->
     if cash_amount <= 0:
         raise ValueError('cash_amount must be positive!')
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        raise TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+    data_source = _resolve_data_source(data_source)
 
     account_id = data_source.insert_sys_table_data(
             'sys_op_live_accounts',
             **{
                 'user_name': user_name,
-                'created_time': pd.to_datetime('today').strftime('%Y-%m-%d %H:%M:%S'),
+                'created_time': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'),
                 'cash_amount': cash_amount,
                 'available_cash': cash_amount,
                 'total_invest': cash_amount,
@@ -80,11 +100,7 @@ def get_all_accounts(data_source=None) -> pd.DataFrame:
         所有账户的信息
     """
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        raise TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+    data_source = _resolve_data_source(data_source)
 
     accounts = data_source.read_sys_table_data('sys_op_live_accounts')
 
@@ -112,11 +128,7 @@ def get_account(account_id, user_name=None, data_source=None) -> dict:
     KeyError: 如果账户不存在，则抛出异常
     """
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        raise TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+    data_source = _resolve_data_source(data_source)
     if user_name is None:
         account = data_source.read_sys_table_record('sys_op_live_accounts', record_id=account_id)
         if account == {}:
@@ -149,16 +161,12 @@ def update_account(account_id, data_source=None, **account_data) -> None:
     None
     """
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        raise TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+    data_source = _resolve_data_source(data_source)
 
     data_source.update_sys_table_data('sys_op_live_accounts', record_id=account_id, **account_data)
 
 
-def update_account_balance(account_id, data_source=None, **cash_change) -> None:
+def update_account_balance(account_id, data_source=None, *, account_record=None, **cash_change) -> None:
     """ 更新账户的资金总额和可用资金, 为了避免误操作，仅允许修改现金总额、可用现金和总投资额，其他字段不可修改
 
     Parameters
@@ -167,6 +175,9 @@ def update_account_balance(account_id, data_source=None, **cash_change) -> None:
         账户的id
     data_source: str, optional
         数据源的名称, 默认为None, 表示使用默认的数据源
+    account_record: dict, optional
+        调用者刚刚读取的完整账户记录（例如get_account()的返回值），给出时不再重复读取账户记录，
+        修改后直接写回数据表。注意该dict会被原地修改
     cash_change: dict, optional {'cash_amount_change': float,
                                  'available_cash_change': float,
                                  'total_investment_change': float}
@@ -180,13 +191,12 @@ def update_account_balance(account_id, data_source=None, **cash_change) -> None:
     #  change available cash and total investment according to two more input arguments:
     #  update_available_cash: bool default False and update_total_investment: bool default False
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        raise TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+    data_source = _resolve_data_source(data_source)
 
-    account_data = data_source.read_sys_table_record('sys_op_live_accounts', record_id=account_id)
+    if account_record is None:
+        account_data = data_source.read_sys_table_record('sys_op_live_accounts', record_id=account_id)
+    else:
+        account_data = account_record
     if account_data == {}:
         raise RuntimeError(f'Account not found! account id: {account_id}')
 
@@ -215,14 +225,13 @@ def update_account_balance(account_id, data_source=None, **cash_change) -> None:
     if cash_amount < 0:
         raise RuntimeError(f'cash_amount cannot be less than 0!')
 
-    # 更新账户的资金总额和可用资金
-    data_source.update_sys_table_data(
-            'sys_op_live_accounts',
-            record_id=account_id,
+    # 更新账户的资金总额和可用资金，账户记录已经完整读取，修改后直接写回，不需要再次读取
+    account_data.update(
             cash_amount=cash_amount,
             available_cash=available_cash,
             total_invest=total_investment,
     )
+    data_source.update_sys_table_record('sys_op_live_accounts', record_id=account_id, record=account_data)
 
 
 def delete_account(account_id: int, data_source=None, keep_account_id=True) -> None:
@@ -243,12 +252,7 @@ def delete_account(account_id: int, data_source=None, keep_account_id=True) -> N
     None
     """
 
-    if data_source is None:
-        import qteasy as qt
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, DataSource):
-        msg = f'data_source must be a DataSource instance, got {type(data_source)} instead'
-        raise TypeError(msg)
+    data_source = _resolve_data_source(data_source)
 
     # 检查account_id是否存在，如果不存在，则直接返回None
     account = get_account(account_id, data_source=data_source)
@@ -302,7 +306,7 @@ def delete_account(account_id: int, data_source=None, keep_account_id=True) -> N
             data_source.delete_sys_table_data('sys_op_live_accounts', record_ids=[account_id])
         else:
             # 保留账户，但是删除账户的持仓并重置创建日期
-            refreshed_data = {'created_time': pd.to_datetime('today').strftime('%Y-%m-%d %H:%M:%S'),
+            refreshed_data = {'created_time': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'),
                               'cash_amount': 0,
                               'available_cash': 0,
                               'total_invest': 0,}
@@ -365,11 +369,7 @@ def get_position_by_id(pos_id, data_source=None):
     RuntimeError: 如果持仓不存在，则报错
     """
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        raise TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+    data_source = _resolve_data_source(data_source)
 
     position = data_source.read_sys_table_record('sys_op_positions', record_id=pos_id)
     if position == {}:
@@ -396,11 +396,7 @@ def get_position_ids(account_id, symbol=None, position_type=None, data_source=No
     position_ids: list of int: 持仓的id列表, 如果没有持仓, 则返回空列表
     """
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        raise TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+    data_source = _resolve_data_source(data_source)
 
     # 获取账户的持仓
     position_filter = {'account_id': account_id}
@@ -441,11 +437,7 @@ def get_or_create_position(account_id: int, symbol: str, position_type: str, dat
     int: 返回持仓记录的id，如果匹配的持仓记录不存在，则创建一条新的空持仓记录，并返回新持仓记录的id
     """
 
-    from qteasy import DataSource, QT_DATA_SOURCE
-    if data_source is None:
-        data_source = QT_DATA_SOURCE
-    if not isinstance(data_source, DataSource):
-        raise TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+    data_source = _resolve_data_source(data_source)
 
     # 检查account_id是否存在，如果不存在，则报错，否则创建的持仓记录将无法关联到账户
     account = get_account(account_id, data_source=data_source)
@@ -484,7 +476,79 @@ def get_or_create_position(account_id: int, symbol: str, position_type: str, dat
     return position.index[0]
 
 
-def update_position(position_id, data_source=None, **position_data):
+def get_or_create_positions(account_id: int, symbols, position_types, data_source: DataSource = None) -> list:
+    """ 批量获取账户的持仓, 不存在的持仓会被创建为新的持仓记录
+
+    与逐个调用get_or_create_position()的结果相同，但是只读取一次账户的所有持仓，所有需要新建的持仓一次写入数据表
+
+    Parameters
+    ----------
+    account_id: int
+        账户的id
+    symbols: list of str
+        交易标的的代码
+    position_types: list of str, {'long', 'short'}
+        持仓类型, 与symbols一一对应，'long'表示多头持仓, 'short'表示空头持仓
+    data_source: DataSource, optional
+        数据源的名称, 默认为None, 表示使用默认的数据源
+
+    Returns
+    -------
+    list of int: 与symbols一一对应的持仓记录的id
+    """
+
+    data_source = _resolve_data_source(data_source)
+    if len(symbols) != len(position_types):
+        raise ValueError('Length of symbols and position_types must be the same')
+
+    account = get_account(account_id, data_source=data_source)
+    if account is None:
+        raise RuntimeError(f'account_id {account_id} not found!')
+
+    for symbol, position_type in zip(symbols, position_types):
+        if not isinstance(symbol, str):
+            raise TypeError(f'symbol must be a str, got {type(symbol)} instead')
+        if not isinstance(position_type, str):
+            raise TypeError(f'position_type must be a str, got {type(position_type)} instead')
+        if position_type not in ('long', 'short'):
+            raise ValueError(f'position_type must be "long" or "short", got {position_type} instead')
+
+    # 一次读取账户的所有持仓，建立(symbol, position)到持仓id的映射
+    positions = data_source.read_sys_table_data(
+            table='sys_op_positions',
+            account_id=account_id,
+    )
+    pos_ids = {}
+    if not positions.empty:
+        pos_keys = list(zip(positions['symbol'], positions['position']))
+        for key, pos_id in zip(pos_keys, positions.index):
+            if key in pos_ids:
+                raise RuntimeError(f'position record is duplicated, got more than one record for {key}')
+            pos_ids[key] = pos_id
+
+    # 按照出现的顺序一次写入所有不存在的持仓，新持仓的id与逐个创建时相同
+    new_keys = []
+    for key in zip(symbols, position_types):
+        if (key not in pos_ids) and (key not in new_keys):
+            new_keys.append(key)
+    if new_keys:
+        new_ids = data_source.insert_sys_table_records(
+                table='sys_op_positions',
+                records=[{
+                    'account_id': account_id,
+                    'symbol': symbol,
+                    'position': position_type,
+                    'qty': 0,
+                    'available_qty': 0,
+                    'cost': 0,
+                } for symbol, position_type in new_keys],
+        )
+        pos_ids.update(zip(new_keys, new_ids))
+
+    return [pos_ids[key] for key in zip(symbols, position_types)]
+
+
+def update_position(position_id, data_source=None, *, position_record=None, **position_data):
     """ 更新账户的持仓，包括持仓的数量和可用数量，account_id, position和symbol不可修改
 
     Parameters
@@ -493,6 +557,9 @@ def update_position(position_id, data_source=None, **position_data):
         持仓的id
     data_source: str, optional
         数据源的名称, 默认为None, 表示使用默认的数据源
+    position_record: dict, optional
+        调用者刚刚读取的完整持仓记录（例如get_position_by_id()的返回值），给出时不再重复读取持仓记录，
+        修改后直接写回数据表。注意该dict会被原地修改
     position_data: dict, optional, {'qty_change': float, 'available_qty_change': float, 'cost': float}
         持仓的数据，只能修改qty, available_qty, cost 这三类数据中的任意一个或多个
 
@@ -504,19 +571,17 @@ def update_position(position_id, data_source=None, **position_data):
     #       the available qty according to boolean argument 'change_available_qty', and change
     #       the cost automatically according to the average cost of increased qty
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
-        raise err
+    data_source = _resolve_data_source(data_source)
 
     if not isinstance(position_id, (int, np.int64)):
         err = TypeError(f'position_id must be an int, got {type(position_id)} instead')
         raise err
 
-    # 从数据库中读取持仓数据，修改后再写入数据库
-    position = data_source.read_sys_table_record('sys_op_positions', record_id=position_id)
+    # 从数据库中读取持仓数据（调用者已经读取时直接使用），修改后再写入数据库
+    if position_record is None:
+        position = data_source.read_sys_table_record('sys_op_positions', record_id=position_id)
+    else:
+        position = position_record
     if position == {}:
         err = RuntimeError(f'position_id {position_id} not found!')
         raise err
@@ -555,13 +620,13 @@ def update_position(position_id, data_source=None, **position_data):
         err = RuntimeError(f'qty ({position["qty"]}+{qty_change}={qty}) cannot be less than 0!')
         raise err
 
-    data_source.update_sys_table_data(
-            'sys_op_positions',
-            record_id=position_id,
+    # 持仓记录已经完整读取，修改后直接写回，不需要再次读取
+    position.update(
             qty=qty,
             available_qty=available_qty,
             cost=cost,
     )
+    data_source.update_sys_table_record('sys_op_positions', record_id=position_id, record=position)
 
 
 def get_account_positions(account_id, data_source=None):
@@ -586,12 +651,7 @@ def get_account_positions(account_id, data_source=None):
     None: 如果账户不存在或持仓不存在，则返回None
     """
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
-        raise err
+    data_source = _resolve_data_source(data_source)
 
     positions = data_source.read_sys_table_data(
             'sys_op_positions',
@@ -778,14 +838,53 @@ def record_trade_order(order, data_source=None):
     写入数据库的交易信号的id
     """
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
+    data_source = _resolve_data_source(data_source)
 
-    err = None
+    _check_trade_order(order)
+
+    return data_source.insert_sys_table_data('sys_op_trade_orders', **order)
+
+
+def record_trade_orders(orders, data_source=None) -> list:
+    """ 将多个交易订单一次写入数据库
+
+    与逐个调用record_trade_order()的结果相同，但是所有的交易订单一次写入数据表
 
-    if not isinstance(data_source, qt.DataSource):
-        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
+    Parameters
+    ----------
+    orders: list of dict
+        标准形式的交易订单，格式与record_trade_order()相同
+    data_source: str, optional
+        数据源的名称, 默认为None, 表示使用默认的数据源
+
+    Returns
+    -------
+    order_ids: list of int
+    写入数据库的交易订单的id，顺序与orders相同
+    """
+
+    data_source = _resolve_data_source(data_source)
+
+    for order in orders:
+        _check_trade_order(order)
+
+    return data_source.insert_sys_table_records('sys_op_trade_orders', records=orders)
+
+
+def _check_trade_order(order) -> None:
+    """ 检查交易订单的格式和数据合法性，不合法时抛出异常
+
+    Parameters
+    ----------
+    order: dict
+        标准形式的交易订单，格式与record_trade_order()相同
+
+    Returns
+    -------
+    None
+    """
+
+    err = None
 
     # 检查交易信号的格式和数据合法性
     if not isinstance(order, dict):
@@ -808,8 +907,6 @@ def record_trade_order(order, data_source=None):
     if err is not None:
         raise err
 
-    return data_source.insert_sys_table_data('sys_op_trade_orders', **order)
-
 
 def read_trade_order(order_id, data_source=None) -> dict:
     """ 根据order_id从数据库中读取交易信号
@@ -830,12 +927,7 @@ def read_trade_order(order_id, data_source=None) -> dict:
         err = TypeError(f'order_id must be an int, got {type(order_id)} instead')
         raise err
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
-        raise err
+    data_source = _resolve_data_source(data_source)
 
     return data_source.read_sys_table_record('sys_op_trade_orders', record_id=order_id)
 
@@ -880,12 +972,8 @@ def update_trade_order(order_id, data_source=None, status=None, qty=None, raise_
     if status is None:
         return None
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
+    data_source = _resolve_data_source(data_source)
     err = None
-    if not isinstance(data_source, qt.DataSource):
-        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
     if status is not None:
         if not isinstance(status, str):
             err = TypeError(f'status must be a str, got {type(status)} instead')
@@ -909,27 +997,23 @@ def update_trade_order(order_id, data_source=None, status=None, qty=None, raise_
             assert qty >= 0, f'qty ({qty}) must be greater than or equal to 0!'
         else:
             qty = trade_signal['qty']
-        submit_time = pd.to_datetime('today').strftime('%Y-%m-%d %H:%M:%S')
-        return data_source.update_sys_table_data(
+        submit_time = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+        # 订单记录已经完整读取，修改后直接写回，不需要再次读取
+        trade_signal.update(submitted_time=submit_time, status=status, qty=qty)
+        return data_source.update_sys_table_record(
                 'sys_op_trade_orders',
                 record_id=order_id,
-                submitted_time=submit_time,
-                status=status,
-                qty=qty,
+                record=trade_signal,
         )
     # 如果trade_signal的状态为 'submitted'，则可以更新为 'canceled', 'partial-filled' 或 'filled'
-    if trade_signal['status'] == 'submitted' and status in ['canceled', 'partial-filled', 'filled']:
-        return data_source.update_sys_table_data(
-                'sys_op_trade_orders',
-                order_id,
-                status=status
-        )
     # 如果trade_signal的状态为 'partial-filled'，则可以更新为 'canceled' 或 'filled'
-    if trade_signal['status'] == 'partial-filled' and status in ['canceled', 'filled']:
-        return data_source.update_sys_table_data(
+    if (trade_signal['status'] == 'submitted' and status in ['canceled', 'partial-filled', 'filled']) or \
+            (trade_signal['status'] == 'partial-filled' and status in ['canceled', 'filled']):
+        trade_signal['status'] = status
+        return data_source.update_sys_table_record(
                 'sys_op_trade_orders',
-                order_id,
-                status=status
+                record_id=order_id,
+                record=trade_signal,
         )
 
     if raise_if_status_wrong:
@@ -974,12 +1058,7 @@ def query_trade_orders(account_id,
     # TODO: move this function to trading_util.py
     # TODO: allow list of str as input for symbol, position, direction, order_type, status
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
-        raise err
+    data_source = _resolve_data_source(data_source)
 
     # 从数据库中读取position的id
     pos_ids = get_position_ids(account_id, symbol, position, data_source=data_source)
@@ -994,19 +1073,12 @@ def query_trade_orders(account_id,
     if status is not None:
         data_filter['status'] = status
 
-    res = []
-    for pos_id in pos_ids:
-        res.append(
-                data_source.read_sys_table_data(
-                        'sys_op_trade_orders',
-                        pos_id=pos_id,
-                        **data_filter,
-                )
-        )
-    if all(r is None for r in res):
+    # 只读取一次交易订单表，再筛选出属于这些持仓的订单，而不是每个持仓都读取一次整个数据表
+    orders = data_source.read_sys_table_data('sys_op_trade_orders', **data_filter)
+    if (orders is None) or orders.empty:
         return pd.DataFrame(columns=['pos_id', 'direction', 'order_type', 'qty', 'price', 'submitted_time', 'status'])
 
-    return pd.concat(res).sort_index()
+    return orders.loc[orders['pos_id'].isin(pos_ids)].sort_index()
 
 
 # 2 2nd level functions for trade signal TODO: (maybe) move to trading_util.py
@@ -1041,12 +1113,7 @@ def read_trade_order_detail(order_id, data_source=None) -> dict:
         }
     """
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
-        raise err
+    data_source = _resolve_data_source(data_source)
 
     trade_order_detail = read_trade_order(order_id, data_source=data_source)
     if trade_order_detail == {}:
@@ -1100,13 +1167,11 @@ def save_parsed_trade_orders(account_id, symbols, positions, directions, quantit
         err = ValueError('Length of symbols, positions, directions, quantities and prices must be the same')
         raise err
 
-    order_ids = []
-    # 逐个处理所有的交易信号要素
-    for sym, pos, dirc, qty, price in zip(symbols, positions, directions, quantities, prices):
-        # 获取pos_id, 如果pos_id不存在，则新建一个posiiton
-        pos_id = get_or_create_position(account_id, sym, pos, data_source=data_source)
-        # 生成交易信号dict
-        trade_order = {
+    # 一次获取所有的pos_id, 不存在的position会被一次性新建
+    pos_ids = get_or_create_positions(account_id, symbols, positions, data_source=data_source)
+    # 生成所有交易信号dict，一次写入数据库
+    trade_orders = [
+        {
             'pos_id': pos_id,
             'direction': dirc,
             'order_type': 'market',  # TODO: 交易信号的order_type应该是可配置的，增加其他配置选项
@@ -1114,11 +1179,10 @@ def save_parsed_trade_orders(account_id, symbols, positions, directions, quantit
             'price': price,
             'submitted_time': None,
             'status': 'created'
-        }
-        sig_id = record_trade_order(trade_order, data_source=data_source)
-        order_ids.append(sig_id)
+        } for pos_id, dirc, qty, price in zip(pos_ids, directions, quantities, prices)
+    ]
 
-    return order_ids
+    return record_trade_orders(trade_orders, data_source=data_source)
 
 
 # 5 foundational functions for trade result
@@ -1197,12 +1261,7 @@ def write_trade_result(trade_result, data_source=None):
         err = ValueError(f'delivery_status can only be ND or DL, got {trade_result["delivery_status"]} instead')
         raise err
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
-        raise err
+    data_source = _resolve_data_source(data_source)
 
     result_id = data_source.insert_sys_table_data('sys_op_trade_results', **trade_result)
     return result_id
@@ -1230,12 +1289,7 @@ def update_trade_result(result_id, delivery_status, data_source=None):
         err = ValueError(f'delivery_status can only be ND or DL, got {delivery_status} instead')
         raise err
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
-        raise err
+    data_source = _resolve_data_source(data_source)
 
     data_source.update_sys_table_data(
             'sys_op_trade_results',
@@ -1270,12 +1324,7 @@ def read_trade_result_by_id(result_id, data_source=None):
         err = TypeError('result_id must be an int')
         raise err
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
-        raise err
+    data_source = _resolve_data_source(data_source)
 
     trade_result = data_source.read_sys_table_record('sys_op_trade_results', record_id=result_id)
     return trade_result
@@ -1316,12 +1365,7 @@ def read_trade_results_by_order_id(order_id, data_source=None):
             err = TypeError('order_id must be an int or a list of int')
             raise err
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
-        raise err
+    data_source = _resolve_data_source(data_source)
 
     if isinstance(order_id, (int, np.int64)):
         trade_results = data_source.read_sys_table_data(
@@ -1363,12 +1407,7 @@ def read_trade_results_by_delivery_status(delivery_status, data_source=None) ->
         err = ValueError(f'delivery_status can only be ND or DL, got {delivery_status} instead')
         raise err
 
-    import qteasy as qt
-    if data_source is None:
-        data_source = qt.QT_DATA_SOURCE
-    if not isinstance(data_source, qt.DataSource):
-        err = TypeError(f'data_source must be a DataSource instance, got {type(data_source)} instead')
-        raise err
+    data_source = _resolve_data_source(data_source)
 
     trade_results = data_source.read_sys_table_data(
             'sys_op_trade_results',
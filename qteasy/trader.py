@@ -14,7 +14,7 @@
 import logging
 import os
 import sys
-import time
+import threading
 
 import numpy as np
 import pandas as pd
@@ -43,6 +43,7 @@ from .trade_recording import (
     query_trade_orders,
     record_trade_order,
     get_or_create_position,
+    get_or_create_positions,
     new_account,
     update_position,
 )
@@ -198,6 +199,8 @@ class Trader(object):
 
         self.task_queue = Queue()
         self.message_queue = Queue()
+        # 有新任务加入任务队列时设置，用于唤醒正在等待的main loop
+        self._task_arrived = threading.Event()
 
         self.task_daily_schedule = []
         self.time_zone = config['time_zone']
@@ -392,7 +395,7 @@ class Trader(object):
 
         tz_time = get_current_timezone_datetime(self.time_zone)
         # if tz_time is very close to local time, then set time_zone to local and return local time
-        if abs(tz_time - pd.to_datetime('today')) < pd.Timedelta(seconds=1):
+        if abs(tz_time - pd.Timestamp.now()) < pd.Timedelta(seconds=1):
             self.time_zone = 'local'
         # else return tz_time
         return tz_time
@@ -526,7 +529,12 @@ class Trader(object):
                     self.send_message(message)
                     self.broker.broker_messages.task_done()
 
-                time.sleep(sleep_interval)
+                # 任务队列或交易结果队列中还有待处理的内容时不等待，立即进入下一次循环，
+                # 避免积压的任务和交易结果每处理一个都要等待一个循环周期
+                # 否则最多等待一个循环周期，等待期间有新任务加入任务队列时立即唤醒
+                self._task_arrived.clear()
+                if self.task_queue.empty() and self.broker.result_queue.empty():
+                    self._task_arrived.wait(sleep_interval)
             else:
                 # process trader when trader is normally stopped
                 self.send_message(f'Trader is stopped.\n'
@@ -1286,7 +1294,7 @@ class Trader(object):
         return break_point_data
 
     def submit_trade_order(self, symbol: str, position: str, direction: str,
-                           order_type: str, qty: int, price: float) -> dict:
+                           order_type: str, qty: int, price: float, pos_id: int = None) -> dict:
         """ 提交订单
 
         Parameters
@@ -1303,6 +1311,8 @@ class Trader(object):
             订单数量
         price: float
             订单价格
+        pos_id: int, optional
+            symbol和position对应的持仓id，如果已经获取了持仓id可以直接给出，否则从数据库中获取或新建持仓
 
         Returns
         -------
@@ -1312,10 +1322,11 @@ class Trader(object):
         if order_type is None:
             order_type = 'market'
 
-        pos_id = get_or_create_position(account_id=self.account_id,
-                                        symbol=symbol,
-                                        position_type=position,
-                                        data_source=self._datasource)
+        if pos_id is None:
+            pos_id = get_or_create_position(account_id=self.account_id,
+                                            symbol=symbol,
+                                            position_type=position,
+                                            data_source=self._datasource)
 
         # 生成交易订单dict
         trade_order = {
@@ -1716,10 +1727,17 @@ class Trader(object):
         operator = self._operator
         signal_type = operator.signal_type
         shares = self.asset_pool
-        own_amounts = self.account_positions['qty']
-        available_amounts = self.account_positions['available_qty']
-        own_cash = self.account_cash[0]
-        available_cash = self.account_cash[1]
+        # 每次运行策略时只读取一次账户的现金和持仓，后续的交易数据和交易信号解析都使用这一份数据
+        account_cash = self.account_cash
+        own_cash = account_cash[0]
+        available_cash = account_cash[1]
+        position_availabilities = get_account_position_availabilities(
+                account_id=self.account_id,
+                shares=shares,
+                data_source=self._datasource,
+        )
+        own_amounts = position_availabilities[1]
+        available_amounts = position_availabilities[2]
         config = self._config
         # window_length = self._operator.max_window_length
         #
@@ -1781,11 +1799,6 @@ class Trader(object):
 
         # 生成N行5列的交易相关数据，包括当前持仓、可用持仓、当前价格、最近成交量、最近成交价格
         trade_data = np.zeros(shape=(len(shares), 5))
-        position_availabilities = get_account_position_availabilities(
-                account_id=self.account_id,
-                shares=shares,
-                data_source=self._datasource,
-        )
         # 当前价格是hist_op的最后一行, 如果需要用latest_data_cycle，最新的实时数据已经包含在hist_op中了
         timing_type = operator[strategy_ids[0]].strategy_timing
         current_prices = hist_op[timing_type, :, -1].squeeze()
@@ -1835,6 +1848,17 @@ class Trader(object):
                           f'quantities: {quantities}\n'
                           f'current_prices: {quoted_prices}\n',
                           debug=True)
+        # 一次获取所有需要提交订单的持仓id，不存在的持仓一次性新建，不再逐个订单查询持仓表
+        order_positions = [(sym, pos) for sym, pos, qty in zip(symbols, positions, quantities) if qty > 0.001]
+        order_pos_ids = dict(zip(
+                order_positions,
+                get_or_create_positions(
+                        account_id=self.account_id,
+                        symbols=[sym for sym, pos in order_positions],
+                        position_types=[pos for sym, pos in order_positions],
+                        data_source=self._datasource,
+                ),
+        ))
         for sym, name, pos, d, qty, price, remark in zip(
                 symbols,
                 names,
@@ -1856,6 +1880,7 @@ class Trader(object):
                     order_type='market',
                     qty=qty,
                     price=price,
+                    pos_id=order_pos_ids[(sym, pos)],
             )
 
             if trade_order:
@@ -2262,6 +2287,7 @@ class Trader(object):
         """
         self.send_message(f'putting task {task} into task queue', debug=True)
         self.task_queue.put(task)
+        self._task_arrived.set()
 
     def _add_task_from_schedule(self, current_time=None) -> None:
         """ 根据当前时间从任务日程中添加任务到任务队列，只有到时间时才添加任务
@@ -2492,13 +2518,14 @@ def start_trader_ui(
         if not isinstance(init_holdings, dict):
             err = ValueError(f'init_holdings must be a dict, got {type(init_holdings)} instead.')
             raise err
-        for symbol, amount in init_holdings.items():
-            pos_id = get_or_create_position(
-                    account_id=account_id,
-                    symbol=symbol,
-                    position_type='long' if amount > 0 else 'short',
-                    data_source=datasource,
-            )
+        # 一次获取或新建所有初始持仓，只读取一次账户的持仓
+        pos_ids = get_or_create_positions(
+                account_id=account_id,
+                symbols=list(init_holdings.keys()),
+                position_types=['long' if amount > 0 else 'short' for amount in init_holdings.values()],
+                data_source=datasource,
+        )
+        for pos_id, amount in zip(pos_ids, init_holdings.values()):
             update_position(
                     position_id=pos_id,
                     data_source=datasource,
@@ -14,6 +14,7 @@
 import os
 import pandas as pd
 import numpy as np
+from numba import njit
 
 from qteasy.__init__ import logger_core as logger
 from qteasy.qt_operator import Operator
@@ -29,7 +30,6 @@ from qteasy.trade_recording import (
     read_trade_results_by_delivery_status,
     write_trade_result,
     read_trade_results_by_order_id,
-    get_account_cash_availabilities,
     update_account_balance,
     update_position,
     update_trade_result,
@@ -271,9 +271,9 @@ def parse_trade_signal(signals,
         available_amounts = own_amounts
     if available_cash is None:
         available_cash = own_cash
-    # 如果没有提供交易信号的配置，使用QT_CONFIG中的默认配置
+    # 如果没有提供交易信号的配置，使用QT_CONFIG中的默认配置，QT_CONFIG已经在模块中导入，每次调用时读取其当前值，
+    # 确保qt.configure()修改的配置能够生效
     if config is None:
-        from qteasy import QT_CONFIG
         config = {
             'PT_buy_threshold': QT_CONFIG['PT_buy_threshold'],
             'PT_sell_threshold': QT_CONFIG['PT_sell_threshold'],
@@ -320,8 +320,9 @@ def parse_trade_signal(signals,
     # 确认总现金是否足够执行交易，如果不足，则将计划买入金额调整为可用的最大值，可用持仓检查可以分别进行
     total_cash_to_spend = np.sum(cash_to_spend)  # 计划买进的总金额
     if total_cash_to_spend > own_cash:
-        # 将计划买入的金额调整为可用的最大值
-        cash_to_spend = cash_to_spend * own_cash / total_cash_to_spend
+        # 将计划买入的金额调整为可用的最大值，cash_to_spend是上面新生成的数组，可以原地修改，不产生临时数组
+        cash_to_spend *= own_cash
+        cash_to_spend /= total_cash_to_spend
 
     # 将计算出的买入和卖出的数量转换为交易订单
     symbols, positions, directions, quantities, quoted_prices, remarks= _signal_to_order_elements(
@@ -386,34 +387,52 @@ def _parse_pt_signals(signals,
         amounts_to_sell: np.ndarray, 卖出资产的数量
     """
 
-    # 计算当前总资产
+    prices = np.asarray(prices, dtype=np.float64)
+    own_amounts = np.asarray(own_amounts, dtype=np.float64)
+    # 计算当前总资产，使用np.sum求和，保证计算结果与逐元素数组运算时完全相同
     total_value = np.sum(prices * own_amounts) + own_cash
+    return _parse_pt_signals_kernel(
+            np.asarray(signals, dtype=np.float64),
+            prices,
+            own_amounts,
+            float(total_value),
+            float(pt_buy_threshold),
+            float(pt_sell_threshold),
+            bool(allow_sell_short),
+    )
+
+
+# 与np.where的结果保持一致，除零时得到inf/nan而不是抛出ZeroDivisionError
+@njit(nogil=True, cache=True, error_model='numpy')
+def _parse_pt_signals_kernel(signals, prices, own_amounts, total_value, pt_buy_threshold, pt_sell_threshold,
+                             allow_sell_short):
+    """ _parse_pt_signals的计算核心，在一次循环中逐个计算所有资产的买入金额和卖出数量，
+    不产生np.where的中间数组，返回值与_parse_pt_signals相同，total_value为当前总资产
+    """
 
     ptbt = pt_buy_threshold
     ptst = -pt_sell_threshold
-    # 计算当前持有头寸的持仓占比，与交易信号相比较，计算持仓差异
-    previous_pos = own_amounts * prices / total_value
-    position_diff = signals - previous_pos
-    # 当不允许买空卖空操作时，只需要考虑持有股票时卖出或买入，即开多仓和平多仓
-    # 当持有份额大于零时，平多仓：卖出数量 = 仓位差 * 持仓份额，此时持仓份额需大于零
-    amounts_to_sell = np.where((position_diff < ptst) & (own_amounts > 0),
-                               position_diff / previous_pos * own_amounts,
-                               0.)
-    # 当持有份额不小于0时，开多仓：买入金额 = 仓位差 * 当前总资产，此时不能持有空头头寸
-    cash_to_spend = np.where((position_diff > ptbt) & (own_amounts >= 0),
-                             position_diff * total_value,
-                             0.)
-    # 当允许买空卖空操作时，需要考虑持有股票时卖出或买入，即开多仓和平多仓，以及开空仓和平空仓
-    if allow_sell_short:
-
-        # 当持有份额小于等于零且交易信号为负，开空仓：买入空头金额 = 仓位差 * 当前总资产，此时持有份额为0
-        cash_to_spend += np.where((position_diff < ptst) & (own_amounts <= 0),
-                                  position_diff * total_value,
-                                  0.)
-        # 当持有份额小于0（即持有空头头寸）且交易信号为正时，平空仓：卖出空头数量 = 仓位差 * 当前持有空头份额
-        amounts_to_sell += np.where((position_diff > ptbt) & (own_amounts < 0),
-                                    position_diff / previous_pos * own_amounts,
-                                    0.)
+    cash_to_spend = np.zeros(len(signals))
+    amounts_to_sell = np.zeros(len(signals))
+    for i in range(len(signals)):
+        # 计算当前持有头寸的持仓占比，与交易信号相比较，计算持仓差异
+        previous_pos = own_amounts[i] * prices[i] / total_value
+        position_diff = signals[i] - previous_pos
+        # 当不允许买空卖空操作时，只需要考虑持有股票时卖出或买入，即开多仓和平多仓
+        # 当持有份额大于零时，平多仓：卖出数量 = 仓位差 * 持仓份额，此时持仓份额需大于零
+        if (position_diff < ptst) and (own_amounts[i] > 0):
+            amounts_to_sell[i] = position_diff / previous_pos * own_amounts[i]
+        # 当持有份额不小于0时，开多仓：买入金额 = 仓位差 * 当前总资产，此时不能持有空头头寸
+        if (position_diff > ptbt) and (own_amounts[i] >= 0):
+            cash_to_spend[i] = position_diff * total_value
+        # 当允许买空卖空操作时，需要考虑持有股票时卖出或买入，即开多仓和平多仓，以及开空仓和平空仓
+        if allow_sell_short:
+            # 当持有份额小于等于零且交易信号为负，开空仓：买入空头金额 = 仓位差 * 当前总资产，此时持有份额为0
+            if (position_diff < ptst) and (own_amounts[i] <= 0):
+                cash_to_spend[i] += position_diff * total_value
+            # 当持有份额小于0（即持有空头头寸）且交易信号为正时，平空仓：卖出空头数量 = 仓位差 * 当前持有空头份额
+            if (position_diff > ptbt) and (own_amounts[i] < 0):
+                amounts_to_sell[i] += position_diff / previous_pos * own_amounts[i]
 
     return cash_to_spend, amounts_to_sell
 
@@ -441,22 +460,43 @@ def _parse_ps_signals(signals, prices, own_amounts, own_cash, allow_sell_short):
         amounts_to_sell: np.ndarray, 卖出资产的数量
     """
 
-    # 计算当前总资产
+    prices = np.asarray(prices, dtype=np.float64)
+    own_amounts = np.asarray(own_amounts, dtype=np.float64)
+    # 计算当前总资产，使用np.sum求和，保证计算结果与逐元素数组运算时完全相同
     total_value = np.sum(prices * own_amounts) + own_cash
+    return _parse_ps_signals_kernel(
+            np.asarray(signals, dtype=np.float64),
+            prices,
+            own_amounts,
+            float(total_value),
+            bool(allow_sell_short),
+    )
 
-    # 当不允许买空卖空操作时，只需要考虑持有股票时卖出或买入，即开多仓和平多仓
-    # 当持有份额大于零时，平多仓：卖出数量 =交易信号 * 持仓份额，此时持仓份额需大于零
-    amounts_to_sell = np.where((signals < 0) & (own_amounts > 0), signals * own_amounts, 0.)
-    # 当持有份额不小于0时，开多仓：买入金额 =交易信号 * 当前总资产，此时不能持有空头头寸
-    cash_to_spend = np.where((signals > 0) & (own_amounts >= 0), signals * total_value, 0.)
 
-    # 当允许买空卖空时，允许开启空头头寸：
-    if allow_sell_short:
+@njit(nogil=True, cache=True)
+def _parse_ps_signals_kernel(signals, prices, own_amounts, total_value, allow_sell_short):
+    """ _parse_ps_signals的计算核心，在一次循环中逐个计算所有资产的买入金额和卖出数量，
+    不产生np.where的中间数组，返回值与_parse_ps_signals相同，total_value为当前总资产
+    """
 
-        # 当持有份额小于等于零且交易信号为负，开空仓：买入空头金额 = 交易信号 * 当前总资产
-        cash_to_spend += np.where((signals < 0) & (own_amounts <= 0), signals * total_value, 0.)
-        # 当持有份额小于0（即持有空头头寸）且交易信号为正时，平空仓：卖出空头数量 = 交易信号 * 当前持有空头份额
-        amounts_to_sell -= np.where((signals > 0) & (own_amounts < 0), signals * own_amounts, 0.)
+    cash_to_spend = np.zeros(len(signals))
+    amounts_to_sell = np.zeros(len(signals))
+    for i in range(len(signals)):
+        # 当不允许买空卖空操作时，只需要考虑持有股票时卖出或买入，即开多仓和平多仓
+        # 当持有份额大于零时，平多仓：卖出数量 =交易信号 * 持仓份额，此时持仓份额需大于零
+        if (signals[i] < 0) and (own_amounts[i] > 0):
+            amounts_to_sell[i] = signals[i] * own_amounts[i]
+        # 当持有份额不小于0时，开多仓：买入金额 =交易信号 * 当前总资产，此时不能持有空头头寸
+        if (signals[i] > 0) and (own_amounts[i] >= 0):
+            cash_to_spend[i] = signals[i] * total_value
+        # 当允许买空卖空时，允许开启空头头寸：
+        if allow_sell_short:
+            # 当持有份额小于等于零且交易信号为负，开空仓：买入空头金额 = 交易信号 * 当前总资产
+            if (signals[i] < 0) and (own_amounts[i] <= 0):
+                cash_to_spend[i] += signals[i] * total_value
+            # 当持有份额小于0（即持有空头头寸）且交易信号为正时，平空仓：卖出空头数量 = 交易信号 * 当前持有空头份额
+            if (signals[i] > 0) and (own_amounts[i] < 0):
+                amounts_to_sell[i] -= signals[i] * own_amounts[i]
 
     return cash_to_spend, amounts_to_sell
 
@@ -484,18 +524,38 @@ def _parse_vs_signals(signals, prices, own_amounts, allow_sell_short):
     - quantities: list of float, 所有交易信号的交易数量
     """
 
-    # 计算各个资产的计划买入金额和计划卖出数量
-    # 当持有份额大于零时，平多仓：卖出数量 = 信号数量，此时持仓份额需大于零
-    amounts_to_sell = np.where((signals < 0) & (own_amounts > 0), signals, 0.)
-    # 当持有份额不小于0时，开多仓：买入金额 = 信号数量 * 资产价格，此时不能持有空头头寸，必须为空仓或多仓
-    cash_to_spend = np.where((signals > 0) & (own_amounts >= 0), signals * prices, 0.)
+    return _parse_vs_signals_kernel(
+            np.asarray(signals, dtype=np.float64),
+            np.asarray(prices, dtype=np.float64),
+            np.asarray(own_amounts, dtype=np.float64),
+            bool(allow_sell_short),
+    )
 
-    # 当允许买空卖空时，允许开启空头头寸：
-    if allow_sell_short:
-        # 当持有份额小于等于零且交易信号为负，开空仓：买入空头金额 = 信号数量 * 资产价格
-        cash_to_spend += np.where((signals < 0) & (own_amounts <= 0), signals * prices, 0.)
-        # 当持有份额小于0（即持有空头头寸）且交易信号为正时，平空仓：卖出空头数量 = 交易信号 * 当前持有空头份额
-        amounts_to_sell -= np.where((signals > 0) & (own_amounts < 0), -signals, 0.)
+
+@njit(nogil=True, cache=True)
+def _parse_vs_signals_kernel(signals, prices, own_amounts, allow_sell_short):
+    """ _parse_vs_signals的计算核心，在一次循环中逐个计算所有资产的买入金额和卖出数量，
+    不产生np.where的中间数组，参数及返回值与_parse_vs_signals相同
+    """
+
+    # 计算各个资产的计划买入金额和计划卖出数量
+    cash_to_spend = np.zeros(len(signals))
+    amounts_to_sell = np.zeros(len(signals))
+    for i in range(len(signals)):
+        # 当持有份额大于零时，平多仓：卖出数量 = 信号数量，此时持仓份额需大于零
+        if (signals[i] < 0) and (own_amounts[i] > 0):
+            amounts_to_sell[i] = signals[i]
+        # 当持有份额不小于0时，开多仓：买入金额 = 信号数量 * 资产价格，此时不能持有空头头寸，必须为空仓或多仓
+        if (signals[i] > 0) and (own_amounts[i] >= 0):
+            cash_to_spend[i] = signals[i] * prices[i]
+        # 当允许买空卖空时，允许开启空头头寸：
+        if allow_sell_short:
+            # 当持有份额小于等于零且交易信号为负，开空仓：买入空头金额 = 信号数量 * 资产价格
+            if (signals[i] < 0) and (own_amounts[i] <= 0):
+                cash_to_spend[i] += signals[i] * prices[i]
+            # 当持有份额小于0（即持有空头头寸）且交易信号为正时，平空仓：卖出空头数量 = 交易信号 * 当前持有空头份额
+            if (signals[i] > 0) and (own_amounts[i] < 0):
+                amounts_to_sell[i] -= -signals[i]
 
     return cash_to_spend, amounts_to_sell
 
@@ -557,113 +617,96 @@ def _signal_to_order_elements(shares,
         base_remark = f'Not enough available cash ({available_cash:.3f}), ' \
                       f'adjusted cash to spend to {available_to_plan_ratio:.1%}'
 
-    # 逐个计算每一只资产的买入和卖出的数量
-    symbols = []  # 股票代码
-    positions = []  # 持仓类型
-    directions = []  # 交易方向
-    quantities = []  # 交易数量
-    quoted_prices = []  # 交易报价
-    remarks = []  # 生成交易信号的说明，用于为trader提供提示
-
-    for i, sym in enumerate(shares):
-        # 计算多头买入的数量
-        if cash_to_spend[i] > 0.001:
-            # 计算买入的数量
-            quantity = np.round(cash_to_spend[i] / prices[i], AMOUNT_DECIMAL_PLACES)
-            if moq_buy > 0:
-                quantity = np.trunc(quantity / moq_buy) * moq_buy
-            symbols.append(sym)
-            positions.append('long')
-            directions.append('buy')
-            quantities.append(quantity)
-            quoted_prices.append(prices[i])
-            remarks.append(base_remark)
-        # 计算空头买入的数量
-        if (cash_to_spend[i] < -0.001) and allow_sell_short:
-            # 计算买入的数量
-            quantity = np.round(-cash_to_spend[i] / prices[i], AMOUNT_DECIMAL_PLACES)
-            if moq_buy > 0:
-                quantity = np.trunc(quantity / moq_buy) * moq_buy
-            symbols.append(sym)
-            positions.append('short')
-            directions.append('buy')
-            quantities.append(quantity)
-            quoted_prices.append(prices[i])
-            remarks.append(base_remark)
-        # 计算多头卖出的数量
-        if amounts_to_sell[i] < -0.001:
-            # 计算卖出的数量，如果可用资产不足，则降低卖出的数量，并增加相反头寸的买入数量，买入剩余的数量
-            if amounts_to_sell[i] < -available_amounts[i]:
-                # 计算卖出的数量
-                quantity = np.round(available_amounts[i], AMOUNT_DECIMAL_PLACES)
-                if moq_sell > 0:
-                    quantity = np.trunc(quantity / moq_sell) * moq_sell
-                symbols.append(sym)
-                positions.append('long')
-                directions.append('sell')
-                quantities.append(quantity)
-                quoted_prices.append(prices[i])
-                remarks.append(base_remark + f'Not enough available stock({available_amounts[i]}), '
-                                             f'sell qty ({amounts_to_sell[i]}) reduced and rounded to {quantity}')
-                # 如果allow_sell_short，增加反向头寸的买入信号
-                if allow_sell_short:
-                    quantity = np.round(- amounts_to_sell[i] - available_amounts[i], AMOUNT_DECIMAL_PLACES)
-                    if moq_sell > 0:
-                        quantity =np.trunc(quantity / moq_sell) * moq_sell
-                    symbols.append(sym)
-                    positions.append('short')
-                    directions.append('buy')
-                    quantities.append(quantity)
-                    quoted_prices.append(prices[i])
-                    remarks.append(base_remark + f'Allow sell short, continue to buy short positions {quantity}')
-            else:
-                # 计算卖出的数量，如果可用资产足够，则直接卖出
-                quantity = np.round(-amounts_to_sell[i], AMOUNT_DECIMAL_PLACES)
-                if moq_sell > 0:
-                    quantity = np.trunc(quantity / moq_sell) * moq_sell
-                symbols.append(sym)
-                positions.append('long')
-                directions.append('sell')
-                quantities.append(quantity)
-                quoted_prices.append(prices[i])
-                remarks.append(base_remark)
-        # 计算空头卖出的数量
-        if (amounts_to_sell[i] > 0.001) and allow_sell_short:
-            # 计算卖出的数量，如果可用资产不足，则降低卖出的数量，并增加相反头寸的买入数量，买入剩余的数量
-            if amounts_to_sell[i] > available_amounts[i]:
-                # 计算卖出的数量
-                quantity = np.round(- available_amounts[i], 2)
-                if moq_sell > 0:
-                    quantity = np.trunc(quantity / moq_sell) * moq_sell
-                symbols.append(sym)
-                positions.append('short')
-                directions.append('sell')
-                quantities.append(quantity)
-                quoted_prices.append(prices[i])
-                remarks.append(base_remark + f'Not enough short position stock ({-available_amounts[i]}), '
-                                             f'sell short qty ({amounts_to_sell[i]}) reduced and rounded to {quantity}')
-                # 增加反向头寸的买入信号
-                quantity = np.round(amounts_to_sell[i] + available_amounts[i], AMOUNT_DECIMAL_PLACES)
-                if moq_sell > 0:
-                    quantity = np.trunc(quantity / moq_sell) * moq_sell
-                symbols.append(sym)
-                positions.append('long')
-                directions.append('buy')
-                quantities.append(quantity)
-                quoted_prices.append(prices[i])
-                remarks.append(base_remark + f'Allow sell short, continue to buy long positions {quantity}')
-            else:
-                # 计算卖出的数量，如果可用资产足够，则直接卖出
-                quantity = np.round(amounts_to_sell[i], AMOUNT_DECIMAL_PLACES)
-                if moq_sell > 0:
-                    quantity = np.trunc(quantity / moq_sell) * moq_sell
-                symbols.append(sym)
-                positions.append('short')
-                directions.append('sell')
-                quantities.append(quantity)
-                quoted_prices.append(prices[i])
-                remarks.append(base_remark)
-
+    # 用数组运算一次性计算所有资产的六类订单: 多头买入、空头买入、多头卖出、可用多头不足时的空头买入、
+    # 空头卖出、可用空头不足时的多头买入，每一类订单记录资产序号和类别序号，最后按照资产序号和类别序号排序，
+    # 使订单的顺序与逐个资产依次生成订单时完全相同
+    prices = np.asarray(prices, dtype=np.float64)
+    available_amounts = np.asarray(available_amounts, dtype=np.float64)
+    cash_to_spend = np.asarray(cash_to_spend, dtype=np.float64)
+    amounts_to_sell = np.asarray(amounts_to_sell, dtype=np.float64)
+
+    def round_to_moq(qty, moq, decimals=AMOUNT_DECIMAL_PLACES):
+        qty = np.round(qty, decimals)
+        if moq > 0:
+            qty = np.trunc(qty / moq) * moq
+        return qty
+
+    ids = []  # 每一类订单对应的资产序号
+    quantities = []  # 每一类订单的交易数量
+    order_kinds = []  # 每一类订单的(持仓类型, 交易方向)
+    kind_remarks = []  # 每一类订单的说明
+
+    # 计算多头买入的数量
+    long_buy = np.flatnonzero(cash_to_spend > 0.001)
+    ids.append(long_buy)
+    quantities.append(round_to_moq(cash_to_spend[long_buy] / prices[long_buy], moq_buy))
+    order_kinds.append(('long', 'buy'))
+    kind_remarks.append([base_remark] * len(long_buy))
+    # 计算空头买入的数量
+    short_buy = np.flatnonzero((cash_to_spend < -0.001) & allow_sell_short)
+    ids.append(short_buy)
+    quantities.append(round_to_moq(-cash_to_spend[short_buy] / prices[short_buy], moq_buy))
+    order_kinds.append(('short', 'buy'))
+    kind_remarks.append([base_remark] * len(short_buy))
+    # 计算多头卖出的数量，如果可用资产不足，则降低卖出的数量，在允许卖空时增加空头头寸的买入数量，买入剩余的数量
+    long_sell = np.flatnonzero(amounts_to_sell < -0.001)
+    not_enough = amounts_to_sell[long_sell] < -available_amounts[long_sell]
+    sell_qty = np.where(not_enough,
+                        round_to_moq(available_amounts[long_sell], moq_sell),
+                        round_to_moq(-amounts_to_sell[long_sell], moq_sell))
+    ids.append(long_sell)
+    quantities.append(sell_qty)
+    order_kinds.append(('long', 'sell'))
+    kind_remarks.append([
+        base_remark + f'Not enough available stock({available_amounts[i]}), '
+                      f'sell qty ({amounts_to_sell[i]}) reduced and rounded to {qty}' if lacking else base_remark
+        for i, qty, lacking in zip(long_sell, sell_qty, not_enough)
+    ])
+    if allow_sell_short:
+        reversed_buy = long_sell[not_enough]
+        buy_qty = round_to_moq(- amounts_to_sell[reversed_buy] - available_amounts[reversed_buy], moq_sell)
+        ids.append(reversed_buy)
+        quantities.append(buy_qty)
+        order_kinds.append(('short', 'buy'))
+        kind_remarks.append([base_remark + f'Allow sell short, continue to buy short positions {qty}'
+                             for qty in buy_qty])
+    # 计算空头卖出的数量，如果可用资产不足，则降低卖出的数量，并增加多头头寸的买入数量，买入剩余的数量
+    if allow_sell_short:
+        short_sell = np.flatnonzero(amounts_to_sell > 0.001)
+        not_enough = amounts_to_sell[short_sell] > available_amounts[short_sell]
+        sell_qty = np.where(not_enough,
+                            round_to_moq(- available_amounts[short_sell], moq_sell, decimals=2),
+                            round_to_moq(amounts_to_sell[short_sell], moq_sell))
+        ids.append(short_sell)
+        quantities.append(sell_qty)
+        order_kinds.append(('short', 'sell'))
+        kind_remarks.append([
+            base_remark + f'Not enough short position stock ({-available_amounts[i]}), '
+                          f'sell short qty ({amounts_to_sell[i]}) reduced and rounded to {qty}' if lacking else base_remark
+            for i, qty, lacking in zip(short_sell, sell_qty, not_enough)
+        ])
+        reversed_buy = short_sell[not_enough]
+        buy_qty = round_to_moq(amounts_to_sell[reversed_buy] + available_amounts[reversed_buy], moq_sell)
+        ids.append(reversed_buy)
+        quantities.append(buy_qty)
+        order_kinds.append(('long', 'buy'))
+        kind_remarks.append([base_remark + f'Allow sell short, continue to buy long positions {qty}'
+                             for qty in buy_qty])
+
+    # 合并所有订单，按照资产序号排序，同一资产的多个订单按照上面的类别顺序排列
+    kind_ids = np.concatenate([np.full(len(share_ids), kind) for kind, share_ids in enumerate(ids)])
+    ids = np.concatenate(ids)
+    order = np.lexsort((kind_ids, ids))
+    ids = ids[order]
+    kinds = [order_kinds[kind] for kind in kind_ids[order]]
+    all_remarks = [remark for remarks in kind_remarks for remark in remarks]
+
+    symbols = [shares[i] for i in ids]  # 股票代码
+    positions = [kind[0] for kind in kinds]  # 持仓类型
+    directions = [kind[1] for kind in kinds]  # 交易方向
+    quantities = np.concatenate(quantities)[order].tolist()  # 交易数量
+    quoted_prices = prices[ids].tolist()  # 交易报价
+    remarks = [all_remarks[i] for i in order]  # 生成交易信号的说明，用于为trader提供提示
     order_elements = (symbols, positions, directions, quantities, quoted_prices, remarks)
     return order_elements
 
@@ -957,7 +1000,7 @@ def deliver_trade_result(result_id, account_id, result=None, stock_delivery_peri
 
     # 读取交易结果的execution_time，如果execution_time与现在的日期差小于交割期，则不予交割
     execution_date = pd.to_datetime(result['execution_time']).date()
-    current_date = pd.to_datetime('today').date()
+    current_date = pd.Timestamp.now().date()
     day_diff = (current_date - execution_date).days
     if day_diff < delivery_period:
         # print(f'[DEBUG]: in deliver_trade_result, calculating day diff: {day_diff} '
@@ -982,6 +1025,7 @@ def deliver_trade_result(result_id, account_id, result=None, stock_delivery_peri
             update_position(
                     position_id=position_id,
                     data_source=data_source,
+                    position_record=position,
                     available_qty_change=result['delivery_amount'],
             )
             delivery_result['updated_qty'] = delivery_result['prev_qty'] + result['delivery_amount']
@@ -1003,6 +1047,7 @@ def deliver_trade_result(result_id, account_id, result=None, stock_delivery_peri
             update_account_balance(
                     account_id=account_id,
                     data_source=data_source,
+                    account_record=account,
                     available_cash_change=result['delivery_amount'],
             )
             delivery_result['updated_amount'] = delivery_result['prev_amount'] + result['delivery_amount']
@@ -1139,7 +1184,9 @@ def process_trade_result(raw_trade_result, data_source=None) -> dict:
     if position_cost is None:
         position_cost = 0
 
-    available_cash = get_account_cash_availabilities(order_detail['account_id'], data_source=data_source)[1]
+    # 读取完整的账户记录，后面更新账户余额时直接修改并写回这条记录，不需要再次读取
+    account_info = get_account(order_detail['account_id'], data_source=data_source)
+    available_cash = account_info['available_cash']
 
     # 如果position_change小于available_position_amount，则抛出异常
     if available_qty + position_change < 0:
@@ -1163,7 +1210,7 @@ def process_trade_result(raw_trade_result, data_source=None) -> dict:
     raw_trade_result['delivery_status'] = 'ND'
 
     # 至此，如果前面所有步骤都没有发生错误，则交易结果有效，生成交易结果的execution_time字段，正式保存交易结果
-    execution_time = pd.to_datetime('today').strftime('%Y-%m-%d %H:%M:%S')  # 产生本地时区时间
+    execution_time = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')  # 产生本地时区时间
     raw_trade_result['execution_time'] = execution_time
     result_id = write_trade_result(raw_trade_result, data_source=data_source)
 
@@ -1206,6 +1253,7 @@ def process_trade_result(raw_trade_result, data_source=None) -> dict:
     update_account_balance(
             account_id=order_detail['account_id'],
             data_source=data_source,
+            account_record=account_info,
             cash_amount_change=cash_amount_change,
             available_cash_change=available_cash_change,
     )
@@ -1213,6 +1261,7 @@ def process_trade_result(raw_trade_result, data_source=None) -> dict:
     update_position(
             position_id=order_detail['pos_id'],
             data_source=data_source,
+            position_record=position_info,
             qty_change=qty_change,
             available_qty_change=available_qty_change,
             cost=new_cost,
@@ -1564,7 +1613,8 @@ def get_symbol_names(datasource, symbols, asset_types: list = None, refresh: boo
     asset_types: list, default None
         资产类型列表，如果给出，则只返回给定资产类型的股票名称，如果不给出，则返回所有资产类型的股票名称
     refresh: bool, default False
-        是否刷新缓存，默认情况下从缓存数据中读取基本信息以加快速度，如果数据源中的数据已更新，需要刷新缓存
+        是否刷新缓存，默认情况下从缓存数据中读取基本信息以加快速度，通过数据源写入基本信息表时缓存会自动清除，
+        只有在数据源之外修改了数据（例如其他进程写入了数据文件）时才需要刷新缓存
 
     Returns
     -------
@@ -20,6 +20,7 @@ import types
 
 from numba import njit
 from functools import wraps, lru_cache
+from operator import itemgetter
 
 TIME_FREQ_LEVELS = {
     'Y':     10,
@@ -516,6 +517,29 @@ def sec_to_duration(t: float, estimation: bool = False, short_form: bool = False
         return time_str
 
 
+def _labels_to_positions(labels: list, str_int_dict: dict) -> np.ndarray:
+    """ 一次性在标签字典中查出一组标签的序号，标签不存在时抛出KeyError
+
+    使用itemgetter在C层面批量查找字典，避免在Python中逐个查找
+
+    Parameters
+    ----------
+    labels: list of str
+        需要查找的标签，不能为空
+    str_int_dict: dict: {str: int}
+        标签序号字典
+
+    Returns
+    -------
+    ndarray of int
+    """
+    positions = itemgetter(*labels)(str_int_dict)
+    if len(labels) == 1:
+        # itemgetter只有一个键时返回单个值而不是tuple
+        return np.array([positions])
+    return np.array(positions)
+
+
 def list_or_slice(unknown_input: [slice, int, str, list], str_int_dict):
     """ 将输入的item转化为slice或数字列表的形式,用于生成HistoryPanel的数据切片：
 
@@ -548,8 +572,7 @@ def list_or_slice(unknown_input: [slice, int, str, list], str_int_dict):
         string_input = unknown_input
         if string_input.find(',') > 0:
             string_list = str_to_list(input_string=string_input, sep_char=',')
-            res = [str_int_dict[string] for string in string_list]
-            return np.array(res)
+            return _labels_to_positions(string_list, str_int_dict)
         elif string_input.find(':') > 0:
             start_end_strings = str_to_list(input_string=string_input, sep_char=':')
             start = str_int_dict[start_end_strings[0]]
@@ -564,13 +587,14 @@ def list_or_slice(unknown_input: [slice, int, str, list], str_int_dict):
         is_list_of_int = isinstance(unknown_input[0], int)
         is_list_of_bool = isinstance(unknown_input[0], bool)
         if is_list_of_bool:
-            return np.array(list(str_int_dict.values()))[unknown_input]
+            # 标签字典的值总是0 ~ n-1的顺序号，不需要从字典中重新生成序号数组
+            return np.arange(len(str_int_dict))[unknown_input]
         else:
             # convert all items into a number:
             if is_list_of_str:
-                res = [str_int_dict[list_item] for list_item in unknown_input]
+                return _labels_to_positions(unknown_input, str_int_dict)
             elif is_list_of_int:
-                res = [list_item for list_item in unknown_input]
+                res = unknown_input
             else:
                 return None
             return np.array(res)
@@ -680,6 +704,40 @@ def str_to_list(input_string, sep_char: str = ',', case=None, dim=None, padder=N
     return res
 
 
+@lru_cache(maxsize=1024)
+def _str_to_tuple(input_string, sep_char: str = ',', case=None) -> tuple:
+    """ str_to_list()的缓存版本，返回不可修改的tuple，供cached_str_to_list()使用"""
+    return tuple(str_to_list(input_string, sep_char=sep_char, case=case))
+
+
+def cached_str_to_list(input_string, sep_char: str = ',', case=None) -> list:
+    """ 与str_to_list()相同，将分隔符分隔的字符串分割成字符串列表，但会缓存分割的结果
+
+    在实盘运行或回测时，相同的股票代码或数据类型字符串会被反复分割，缓存结果后重复分割同样的字符串只需查找缓存，
+    每次调用都返回一个新的列表，调用者修改返回的列表不会影响缓存
+
+    Parameters
+    ----------
+    input_string: str:
+        需要分割的字符串
+    sep_char: str, default: ','
+        字符串分隔符， 默认','
+    case: str, Optional
+        默认None, 是否改变大小写，upper输出全大写, lower输出全小写
+
+    Returns
+    -------
+    list of str: 字符串分割后的列表
+
+    Examples
+    --------
+    >>> cached_str_to_list('a, b, c, d')
+    ['a', 'b', 'c', 'd']
+    """
+    assert isinstance(input_string, str), f'InputError, input is not a string!, got {type(input_string)}'
+    return list(_str_to_tuple(input_string, sep_char, case))
+
+
 def input_to_list(pars, dim, padder=None):
     """将输入的参数转化为List，同时确保输出的List对象中元素的数量至少为dim，不足dim的用padder补足
 
@@ -809,7 +867,7 @@ def progress_bar(prog: int, total: int = 100, *, comments: str = '', column_widt
         prog = total
 
     progress_str = f'\r \r[{PROGRESS_BAR[int(prog / total * 40)]}]' \
-                   f'{prog}/{total}-{np.round(prog / total * 100, 1)}%  {comments}'
+                   f'{prog}/{total}-{round(prog / total * 100, 1)}%  {comments}'
     if column_width > 0:
         progress_str = adjust_string_length(progress_str, column_width, cut_off=cut_off_pos)
     sys.stdout.write(progress_str)
@@ -828,10 +886,10 @@ def get_current_timezone_datetime(time_zone='local'):
         符合标准的时区字符串
     """
     if time_zone == 'local':
-        return pd.to_datetime('today')
+        return pd.Timestamp.now()
     else:
         # create utc time and convert to time_zone time and remove time_zone information
-        dt = pd.to_datetime('now', utc=True).tz_convert(time_zone)
+        dt = pd.Timestamp.now(tz='UTC').tz_convert(time_zone)
         return pd.to_datetime(dt.tz_localize(None))
 
 
@@ -1038,6 +1096,46 @@ def last_known_market_trade_day(exchange: str = 'SSE'):
         raise RuntimeError(msg)
 
 
+@lru_cache(maxsize=16)
+def market_trade_days(exchange: str = 'SSE'):
+    """ 返回交易日历中某交易所的全部交易日，用于批量判断交易日或批量查找最近交易日
+
+    Parameters
+    ----------
+    exchange: str
+        交易所代码:
+            SSE:    上交所, SZSE:   深交所,
+            CFFEX:  中金所, SHFE:   上期所,
+            CZCE:   郑商所, DCE:    大商所,
+            INE:    上能源, IB:     银行间,
+            XHKG:   港交所
+
+    Returns
+    -------
+    pd.DatetimeIndex
+        按日期升序排列的全部交易日
+
+    Raises
+    ------
+    RuntimeError: 要求在本地DataSource中必须存在'trade_calendar'表，否则报错
+    """
+
+    from qteasy import QT_TRADE_CALENDAR
+
+    if QT_TRADE_CALENDAR is None:
+        msg = 'Trade Calendar is not available, please download basic data into DataSource, Use:\n' \
+              'qteasy.refill_data_source(tables="basics")\n' \
+              'see more details in qteasy docs: https://qteasy.readthedocs.io/zh/latest/'
+        raise RuntimeError(msg)
+    try:
+        exchange_trade_cal = QT_TRADE_CALENDAR.loc[(slice(None), exchange), ]
+    except KeyError as e:
+        msg = f'Trade Calender for exchange: {e} was not properly downloaded, please refill data'
+        raise KeyError(msg)
+    open_days = exchange_trade_cal.index.get_level_values(0)[exchange_trade_cal.is_open.values == 1]
+    return pd.DatetimeIndex(pd.to_datetime(open_days)).sort_values()
+
+
 @lru_cache(maxsize=16)
 def prev_market_trade_day(date, exchange='SSE'):
     """ 根据交易所发布的交易日历找到某一日的上一交易日，需要提前准备QT_TRADE_CALENDAR数据
@@ -1129,13 +1227,12 @@ def nearest_market_trade_day(date, exchange='SSE'):
     last_known_trade_day = last_known_market_trade_day(exchange)
     if _date < pd.to_datetime('19910101') or _date > last_known_trade_day:
         return None
-    if is_market_trade_day(_date, exchange):
-        return _date
-    else:
-        prev = _date - pd.Timedelta(1, 'd')
-        while not is_market_trade_day(prev):
-            prev = prev - pd.Timedelta(1, 'd')
-        return prev
+    # 在排好序的交易日序列中二分查找当日或之前最近的交易日，不需要逐日向前判断
+    trade_days = market_trade_days(exchange)
+    pos = trade_days.searchsorted(_date, side='right') - 1
+    if pos < 0:
+        return None
+    return trade_days[pos]
 
 
 @lru_cache(maxsize=16)
@@ -1183,13 +1280,12 @@ def next_market_trade_day(date, exchange='SSE', nearest_only=True):
     last_known_trade_day = last_known_market_trade_day(exchange)
     if _date < pd.to_datetime('19910101') or _date > last_known_trade_day:
         return None
-    if is_market_trade_day(_date, exchange) and nearest_only:
-        return _date
-    else:
-        next_date = _date + pd.Timedelta(1, 'd')
-        while not is_market_trade_day(next_date):
-            next_date = next_date + pd.Timedelta(1, 'd')
-        return next_date
+    # 在排好序的交易日序列中二分查找当日(nearest_only=True时)或之后的下一个交易日
+    trade_days = market_trade_days(exchange)
+    pos = trade_days.searchsorted(_date, side='left' if nearest_only else 'right')
+    if pos >= len(trade_days):
+        return None
+    return trade_days[pos]
 
 
 def weekday_name(weekday: int):
@@ -1624,6 +1720,9 @@ def _lev_ratio(s, t):
 
     s = s.lower()
     t = t.lower()
+    if s and (s == t):
+        # 完全相同的字符串不需要计算距离矩阵
+        return 1.0
     # Initialize matrix of zeros
     rows = len(s) + 1
     cols = len(t) + 1
@@ -1680,6 +1779,9 @@ def _partial_lev_ratio(s, t):
     else:
         longer = t
         shorter = s
+    if shorter and (shorter in longer):
+        # 较短的字符串是较长字符串的一部分时，局部相似度必然为1，不需要逐段计算
+        return 1.0
     l_short = len(shorter)
     l_long = len(longer)
     length = l_long - l_short + 1
@@ -1758,15 +1860,15 @@ def ffill_3d_data(arr, init_val=0.):
 
     """
     lv, row, col = arr.shape
-    r0 = arr[:, 0, :]
-    r0 = np.where(np.isnan(r0), init_val, r0)
-    for i in range(row):
-        if i == 0:
-            arr[:, i, :] = r0
-        r_c = arr[:, i, :]
-        r_c = np.where(np.isnan(r_c), r0, r_c)
-        r0 = r_c
-        arr[:, i, :] = r_c
+    # 逐个元素原地填充，每一行使用上一行已填充的值，不再为每一行生成临时数组
+    for lvl in range(lv):
+        for j in range(col):
+            if np.isnan(arr[lvl, 0, j]):
+                arr[lvl, 0, j] = init_val
+        for i in range(1, row):
+            for j in range(col):
+                if np.isnan(arr[lvl, i, j]):
+                    arr[lvl, i, j] = arr[lvl, i - 1, j]
     return arr
 
 
@@ -1850,6 +1952,71 @@ def fill_inf_data(arr, fill_val=0.):
     return np.where(np.isinf(arr), fill_val, arr)
 
 
+@njit()
+def has_nan_3d_data(arr):
+    """ 判断一个三维np数组中是否含有nan值，遇到第一个nan值时立即返回
+
+    与np.isnan(arr).any()结果相同，但不生成与数组同样大小的中间布尔数组，且不需要遍历全部数据
+
+    Parameters
+    ----------
+    arr: 3D ndarray
+        需要检查的三维数组
+
+    Returns
+    -------
+    bool
+
+    Examples
+    --------
+    >>> has_nan_3d_data(np.array([[[1., 2.], [np.nan, 4.]]]))
+    True
+    >>> has_nan_3d_data(np.array([[[1., 2.], [3., 4.]]]))
+    False
+    """
+    lv, row, col = arr.shape
+    for lvl in range(lv):
+        for i in range(row):
+            for j in range(col):
+                if arr[lvl, i, j] != arr[lvl, i, j]:
+                    return True
+    return False
+
+
+@njit()
+def count_non_nan_3d_data(arr):
+    """ 给定一个三维np数组，沿axis=1统计每一层每一列中非nan值的个数
+
+    与np.sum(~np.isnan(arr), 1)结果相同，但只遍历一次数组，不生成与数组同样大小的中间布尔数组
+
+    Parameters
+    ----------
+    arr: 3D ndarray
+        需要统计的三维数组
+
+    Returns
+    -------
+    2D ndarray of int, shape为(arr.shape[0], arr.shape[2])
+
+    Examples
+    --------
+    >>> arr = np.array([[[1, 2, 3], [np.nan, np.nan, 6]],
+    ...                 [[np.nan, 3, 5], [4, np.nan, np.nan]]])
+    >>> count_non_nan_3d_data(arr)
+    array([[1, 1, 2],
+           [1, 1, 1]])
+    """
+    lv, row, col = arr.shape
+    res = np.zeros((lv, col), dtype=np.int64)
+    for lvl in range(lv):
+        for i in range(row):
+            for j in range(col):
+                # nan是唯一不等于自身的值，这个判断对整数数组同样适用
+                if arr[lvl, i, j] == arr[lvl, i, j]:
+                    res[lvl, j] += 1
+    return res
+
+
 def rolling_window(arr, window, axis=0):
     """ 给定一个ndarray，生成一个滑动窗口视图
 
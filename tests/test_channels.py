@@ -378,6 +378,25 @@ class TestChannels(unittest.TestCase):
                 ]
         )
 
+    def test_parse_additional_time_args(self):
+        """ testing parsing additional start/end args with empty or invalid chunk sizes"""
+        whole_period = [{'start': '20210101', 'end': '20210321'}]
+        for chunk_size in [None, '', ' ', '0', 0, '-15', 'abc']:
+            res = _parse_additional_time_args(chunk_size, '20210101', '20210321')
+            print(f'chunk size: {chunk_size!r}:\n{res}')
+            self.assertEqual(res, whole_period)
+
+        res = _parse_additional_time_args('30', '20210101', '20210321')
+        print(f'chunk size: \'30\':\n{res}')
+        self.assertEqual(
+                res,
+                [
+                    {'start': '20210101', 'end': '20210131'},
+                    {'start': '20210131', 'end': '20210302'},
+                    {'start': '20210302', 'end': '20210321'},
+                ]
+        )
+
     def test_table_arg_parsing(self):
         """ testing parsing complete table download args """
 
@@ -1078,6 +1078,24 @@ class TestDataSource(unittest.TestCase):
         self.assertEqual(self.ds_fth.tables, ['stock_daily'])
         self.assertEqual(self.ds_db.tables, ['stock_daily'])
 
+    def test_read_cached_table_data(self):
+        """ test that cached table data is refreshed after the table is written, updated or dropped"""
+        test_table = 'stock_daily'
+        for data_source in [self.ds_csv, self.ds_hdf, self.ds_fth]:
+            data_source.drop_table_data(test_table)
+            data_source.write_table_data(self.built_in_df, test_table)
+            cached = data_source.read_cached_table_data(test_table)
+            self.assertEqual(len(cached), len(self.built_in_df))
+            # 重复读取时返回缓存的数据
+            self.assertIs(data_source.read_cached_table_data(test_table), cached)
+
+            data_source.update_table_data(test_table, df=self.built_in_add_df, merge_type='update')
+            cached = data_source.read_cached_table_data(test_table)
+            self.assertTrue(cached.equals(data_source.read_table_data(test_table)))
+
+            data_source.drop_table_data(test_table)
+            self.assertTrue(data_source.read_cached_table_data(test_table).empty)
+
     def test_export_table_data(self):
         """ 测试函数datasource.export_table_data"""
         # TODO: implement this test
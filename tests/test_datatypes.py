@@ -12,6 +12,7 @@
 import unittest
 
 import pandas as pd
+import numpy as np
 
 from qteasy.database import DataSource
 from qteasy.utilfuncs import (
@@ -25,6 +26,7 @@ from qteasy.datatypes import (
     get_history_data_from_source,
     get_reference_data_from_source,
     get_tables_by_dtypes, infer_data_types,
+    _unstack_symbols,
 )
 
 ALL_TYPES_TO_TEST_WITH_FULL_ID = [
@@ -2181,6 +2183,31 @@ class TestDataTypes(unittest.TestCase):
         self.assertTrue(all(dt in expected_data_types for dt in data_types))
         self.assertTrue(all(dt in data_types for dt in expected_data_types))
 
+    def test_unstack_symbols(self):
+        """ test function _unstack_symbols, results should be identical to pandas unstack"""
+        codes = ['000001.SZ', '000002.SZ', '000003.SZ', '600000.SH']
+        dates = pd.date_range('20240101', periods=6)
+        m_index = pd.MultiIndex.from_product([codes, dates], names=['ts_code', 'trade_date'])
+        for dtype in ['float64', 'float32', 'int64']:
+            full_series = pd.Series((np.random.rand(len(m_index)) * 100).astype(dtype), index=m_index)
+            part_series = full_series.iloc[np.random.permutation(len(m_index))[:15]]
+            for series in [full_series, part_series]:
+                for level in ['ts_code', 0, 'trade_date']:
+                    print(f'unstacking series of dtype {dtype} with {len(series)} rows on level {level}')
+                    res = _unstack_symbols(series, level=level)
+                    target = series.unstack(level=level)
+                    pd.testing.assert_frame_equal(res, target)
+
+        # non-numeric data falls back to unstack
+        str_series = pd.Series(['a', 'b', 'c', 'd'], index=m_index[[0, 7, 13, 20]])
+        pd.testing.assert_frame_equal(_unstack_symbols(str_series, level='ts_code'),
+                                      str_series.unstack(level='ts_code'))
+
+        # duplicated index raises just like unstack
+        dup_series = pd.Series([1., 2.], index=m_index[[0, 0]])
+        with self.assertRaises(ValueError):
+            _unstack_symbols(dup_series, level='ts_code')
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -19,7 +19,10 @@ from qteasy.datatypes import infer_data_types
 from qteasy.utilfuncs import str_to_list
 from qteasy.history import (
     stack_dataframes,
+    hp_join,
     ffill_3d_data,
+    count_non_nan_3d_data,
+    has_nan_3d_data,
 )
 
 
@@ -78,6 +81,18 @@ class TestHistoryPanel(unittest.TestCase):
         """
         self.assertEqual(len(self.hp), 10)
 
+    def test_str_of_long_history_panel(self):
+        """ 测试行数超过pandas显示上限的HistoryPanel的打印结果与完整DataFrame的打印结果相同"""
+        values = np.random.randint(10, size=(2, 200, 3)).astype('float')
+        temp_hp = qt.HistoryPanel(values,
+                                  levels='000100,000200',
+                                  columns='close,open,high',
+                                  rows=pd.date_range('2020-01-01', periods=200))
+        hp_str = temp_hp.__str__()
+        print(hp_str)
+        for share in temp_hp.shares:
+            self.assertIn(temp_hp.slice_to_dataframe(share=share).__str__(), hp_str)
+
     def test_empty_history_panel(self):
         """测试空HP或者特殊HP如维度标签为纯数字的HP"""
         test_hp = qt.HistoryPanel(self.data)
@@ -196,6 +211,14 @@ class TestHistoryPanel(unittest.TestCase):
         print('test creating HistoryPanel with 2D arr')
         temp_data = np.random.randint(10, size=(7, 3)).astype('float')
         temp_hp = qt.HistoryPanel(temp_data)
+        print('test creating HistoryPanel with DatetimeIndex rows and string rows in mixed formats')
+        temp_data = np.random.randint(10, size=(1, 3, 2)).astype('float')
+        date_index = pd.date_range('2020-01-01', periods=3)
+        temp_hp = qt.HistoryPanel(temp_data, levels='000100', columns='close,open', rows=date_index)
+        self.assertEqual(temp_hp.hdates, list(date_index))
+        temp_hp = qt.HistoryPanel(temp_data, levels='000100', columns='close,open',
+                                  rows=['2020-01-01', '20200102', '2020/01/03'])
+        self.assertEqual(temp_hp.hdates, list(date_index))
 
         # Error testing during HistoryPanel creating
         # shape does not match
@@ -412,6 +435,17 @@ class TestHistoryPanel(unittest.TestCase):
         # check that hdates are the same
         self.assertEqual(seg1.hdates, test_hp.hdates)
 
+        print(f'Test segment and copy do not share label dicts with the original')
+        seg1 = test_hp.isegment(1, 3)
+        self.assertEqual(seg1.hdates, test_hp.hdates[1:3])
+        self.assertEqual(list(seg1.rows.values()), [0, 1])
+        copied = test_hp.copy()
+        copied.shares = [f'{share}_new' for share in test_hp.shares]
+        self.assertNotEqual(copied.shares, test_hp.shares)
+        self.assertEqual(copied.hdates, test_hp.hdates)
+        print(f'Test segment with no dates in range')
+        self.assertTrue(test_hp.segment('2030-01-01').is_empty)
+
     def test_slice(self):
         """测试历史数据切片的获取"""
         test_hp = qt.HistoryPanel(self.data,
@@ -505,6 +539,15 @@ class TestHistoryPanel(unittest.TestCase):
         self.assertEqual(self.hp.shares, temp_hp.shares)
         self.assertEqual(self.hp.hdates, temp_hp.hdates)
         self.assertEqual(temp_hp.htypes, new_htypes_list)
+        print(f'test re_label after labels are cached')
+        temp_hp = self.hp.copy()
+        print(temp_hp.shares, temp_hp.htypes, temp_hp.hdates_array)
+        new_hdates_list = list(pd.date_range('2021-01-01', periods=temp_hp.row_count))
+        temp_hp.re_label(shares=new_shares_list, htypes=new_htypes_list, hdates=new_hdates_list)
+        self.assertEqual(temp_hp.shares, new_shares_list)
+        self.assertEqual(temp_hp.htypes, new_htypes_list)
+        self.assertEqual(temp_hp.hdates, new_hdates_list)
+        self.assertEqual(list(temp_hp.hdates_array), new_hdates_list)
         print(f'test errors raising')
         temp_hp = self.hp.copy()
         self.assertRaises(AssertionError, temp_hp.re_label, htypes=new_shares_str)
@@ -528,6 +571,42 @@ class TestHistoryPanel(unittest.TestCase):
         print(f'join two simple HistoryPanels with same shares')
         temp_hp = self.hp.join(self.hp2, same_shares=True)
         self.assertIsInstance(temp_hp, qt.HistoryPanel)
+        print(f'join two HistoryPanels with overlapping htypes and hdates')
+        hp1 = qt.HistoryPanel(np.ones((1, 3, 2)), levels='000100', columns='close,open',
+                              rows=pd.date_range('2020-01-02', periods=3))
+        hp2 = qt.HistoryPanel(np.full((1, 3, 2), 2.), levels='000100', columns='high,close',
+                              rows=pd.date_range('2020-01-01', periods=3))
+        temp_hp = hp1.join(hp2, same_shares=True)
+        self.assertEqual(temp_hp.htypes, ['close', 'high', 'open'])
+        self.assertEqual(temp_hp.hdates, list(pd.date_range('2020-01-01', periods=4)))
+        target = np.array([[[2., 2., np.nan],
+                            [1., 2., 1.],
+                            [1., 2., 1.],
+                            [1., np.nan, 1.]]])
+        self.assertTrue(np.allclose(temp_hp.values, target, equal_nan=True))
+
+        print(f'join several HistoryPanels with hp_join')
+        hp3 = qt.HistoryPanel(np.full((1, 2, 1), 3.), levels='000200', columns='close',
+                              rows=pd.date_range('2020-01-03', periods=2))
+        temp_hp = hp_join(hp1, hp2, qt.HistoryPanel(), hp3)
+        self.assertEqual(temp_hp.shares, ['000100', '000200'])
+        self.assertEqual(temp_hp.htypes, ['close', 'high', 'open'])
+        self.assertEqual(temp_hp.hdates, list(pd.date_range('2020-01-01', periods=4)))
+        target = np.array([[[2., 2., np.nan],
+                            [1., 2., 1.],
+                            [1., 2., 1.],
+                            [1., np.nan, 1.]],
+                           [[np.nan, np.nan, np.nan],
+                            [np.nan, np.nan, np.nan],
+                            [3., np.nan, np.nan],
+                            [3., np.nan, np.nan]]])
+        self.assertTrue(np.allclose(temp_hp.values, target, equal_nan=True))
+        self.assertTrue(hp_join(qt.HistoryPanel()).is_empty)
+        single_hp = hp_join(hp1)
+        self.assertIsNot(single_hp, hp1)
+        self.assertTrue(np.allclose(single_hp.values, hp1.values, equal_nan=True))
+        self.assertEqual(single_hp.shares, hp1.shares)
+        self.assertEqual(single_hp.htypes, hp1.htypes)
 
     def test_df_to_hp(self):
         print(f'test converting DataFrame to HistoryPanel')
@@ -655,12 +734,16 @@ class TestHistoryPanel(unittest.TestCase):
         print('test convert history panel slice by share')
         df_dict = self.hp.to_df_dict('share')
         self.assertEqual(self.hp.shares, list(df_dict.keys()))
+        for share, df in df_dict.items():
+            self.assertTrue(df.equals(self.hp.slice_to_dataframe(share=share)))
         df_dict = self.hp.to_df_dict()
         self.assertEqual(self.hp.shares, list(df_dict.keys()))
 
         print('test convert historypanel slice by htype ')
         df_dict = self.hp.to_df_dict('htype')
         self.assertEqual(self.hp.htypes, list(df_dict.keys()))
+        for htype, df in df_dict.items():
+            self.assertTrue(df.equals(self.hp.slice_to_dataframe(htype=htype)))
 
         print('test raise assertion error')
         self.assertRaises(AssertionError, self.hp.to_df_dict, by='random text')
@@ -670,6 +753,18 @@ class TestHistoryPanel(unittest.TestCase):
         df_dict = qt.HistoryPanel().to_df_dict('share')
         self.assertEqual(df_dict, {})
 
+    def test_to_htype_arrays(self):
+        """ 测试HistoryPanel对象的to_htype_arrays方法"""
+        arrays = self.hp.to_htype_arrays()
+        self.assertEqual(list(arrays.keys()), self.hp.htypes)
+        for htype, arr in arrays.items():
+            self.assertTrue(arr.flags['C_CONTIGUOUS'])
+            self.assertEqual(arr.shape, (self.hp.level_count, self.hp.row_count))
+            self.assertTrue(np.allclose(arr, self.hp[htype].reshape(arr.shape)))
+        arrays = self.hp.to_htype_arrays(dtype='float32')
+        self.assertTrue(all(arr.dtype == np.float32 for arr in arrays.values()))
+        self.assertEqual(qt.HistoryPanel().to_htype_arrays(), {})
+
     def test_stack_dataframes(self):
         print('test stack dataframes in a list')
         df1 = pd.DataFrame({'a': [1, 2, 3, 4], 'b': [2, 3, 4, 5], 'c': [3, 4, 5, 6]})
@@ -750,6 +845,14 @@ class TestHistoryPanel(unittest.TestCase):
         self.assertEqual(hp4.shares, ['a', 'b', 'c', 'd'])
         self.assertTrue(np.allclose(hp4.values, values2, equal_nan=True))
 
+        print('test stack dataframes with float32 data type')
+        hp5 = stack_dataframes([df1, df2, df3], dataframe_as='shares',
+                               shares=['000100', '000200', '000300'], dtype='float32')
+        self.assertEqual(hp5.values.dtype, np.float32)
+        self.assertTrue(np.allclose(hp5.values, values1, equal_nan=True))
+        self.assertRaises(AssertionError, stack_dataframes, [df1, df2, df3],
+                          dataframe_as='shares', shares=['000100', '000200', '000300'], dtype='int')
+
         print('test stack dataframes in a dict')
         df1 = pd.DataFrame({'a': [1, 2, 3, 4], 'b': [2, 3, 4, 5], 'c': [3, 4, 5, 6]})
         df1.index = ['20200101', '20200102', '20200103', '20200104']
@@ -854,6 +957,21 @@ class TestHistoryPanel(unittest.TestCase):
         filled_values[[0, 1, 3, 2], [1, 3, 0, 2], [1, 3, 2, 2]] = 2.3
         self.assertTrue(np.allclose(temp_hp.values,
                                     filled_values, equal_nan=True))
+        print('test fillna on HistoryPanel without nan values keeps values untouched')
+        original_values = temp_hp.values
+        self.assertIs(temp_hp.fillna(0.), temp_hp)
+        self.assertIs(temp_hp.values, original_values)
+
+    def test_as_type(self):
+        """测试转换数据类型"""
+        temp_hp = qt.HistoryPanel(np.random.randint(10, size=(2, 5, 3)).astype('float'))
+        original_values = temp_hp.values
+        temp_hp.as_type('float')
+        self.assertIs(temp_hp.values, original_values)
+        temp_hp.as_type('int')
+        self.assertEqual(temp_hp.values.dtype, np.dtype('int'))
+        self.assertTrue(np.allclose(temp_hp.values, original_values))
+        self.assertRaises(AssertionError, temp_hp.as_type, 'complex')
 
     def test_fill_inf(self):
         """测试填充无限值"""
@@ -892,6 +1010,22 @@ class TestHistoryPanel(unittest.TestCase):
         self.assertTrue(np.allclose(new_values, temp_hp.values, 7, equal_nan=True))
         self.assertTrue(np.all(~np.isnan(temp_hp.values)))
 
+    def test_count_non_nan_data(self):
+        """ 测试统计非NaN值的个数"""
+        d = np.random.random((3, 20, 4))
+        d[d < 0.3] = np.nan
+        self.assertTrue(np.array_equal(count_non_nan_3d_data(d), np.sum(~np.isnan(d), 1)))
+        d = np.random.randint(10, size=(3, 20, 4))
+        self.assertTrue(np.array_equal(count_non_nan_3d_data(d), np.full((3, 4), 20)))
+
+    def test_has_nan_data(self):
+        """ 测试判断数组中是否含有NaN值"""
+        d = np.random.random((3, 20, 4))
+        self.assertFalse(has_nan_3d_data(d))
+        d[2, 19, 3] = np.nan
+        self.assertTrue(has_nan_3d_data(d))
+        self.assertFalse(has_nan_3d_data(np.random.randint(10, size=(3, 20, 4))))
+
     def test_ffill_data(self):
         """ 测试前向填充NaN值"""
         d = np.array([[[0.03, 0.88, 0.2],
@@ -25,6 +25,7 @@ from qteasy.trading_util import calculate_cost_change
 
 from qteasy.trade_recording import new_account, get_account, update_account, update_account_balance
 from qteasy.trade_recording import update_position, get_account_positions, get_or_create_position
+from qteasy.trade_recording import get_or_create_positions
 from qteasy.trade_recording import record_trade_order, update_trade_order, read_trade_order
 from qteasy.trade_recording import query_trade_orders, get_position_by_id, update_trade_result
 from qteasy.trade_recording import get_position_ids, read_trade_order_detail, save_parsed_trade_orders
@@ -107,6 +108,13 @@ class TestTradeRecording(unittest.TestCase):
         update_account_balance(1, data_source=self.test_ds, cash_amount_change=1000.0, available_cash_change=1000.0)
         self.assertEqual(get_account(1, data_source=self.test_ds)['cash_amount'], 9000.0)
         self.assertEqual(get_account(1, data_source=self.test_ds)['available_cash'], 9000.0)
+        # update account balance with an account record that has already been read
+        account = get_account(1, data_source=self.test_ds)
+        update_account_balance(1, data_source=self.test_ds, account_record=account,
+                               cash_amount_change=500.0, available_cash_change=0.0)
+        self.assertEqual(get_account(1, data_source=self.test_ds)['cash_amount'], 9500.0)
+        self.assertEqual(get_account(1, data_source=self.test_ds)['available_cash'], 9000.0)
+        self.assertEqual(get_account(1, data_source=self.test_ds)['user_name'], 'test_user1')
 
         # update account balance and available cash with non-existing account id
         with self.assertRaises(RuntimeError):
@@ -224,6 +232,23 @@ class TestTradeRecording(unittest.TestCase):
         self.assertEqual(position.loc[6]['position'], 'short')
         self.assertEqual(position.loc[6]['qty'], 0)
 
+        # get existing and new positions in one batch, new positions are created in the order they appear
+        pos_ids = get_or_create_positions(
+                2,
+                ['GOOG', 'MSFT', 'APPL', 'MSFT', 'TSLA'],
+                ['short', 'long', 'long', 'long', 'short'],
+                data_source=self.test_ds,
+        )
+        self.assertEqual(list(pos_ids), [6, 7, 3, 7, 8])
+        position = get_position_by_id(7, data_source=self.test_ds)
+        self.assertEqual(position['account_id'], 2)
+        self.assertEqual(position['symbol'], 'MSFT')
+        self.assertEqual(position['position'], 'long')
+        self.assertEqual(position['qty'], 0)
+        self.assertEqual(get_or_create_position(2, 'TSLA', 'short', data_source=self.test_ds), 8)
+        with self.assertRaises(ValueError):
+            get_or_create_positions(2, ['APPL'], ['long123'], data_source=self.test_ds)
+
     def test_update_position(self):
         """ test update_position function """
         # clear existing accounts and positions, add test accounts and positions
@@ -282,6 +307,13 @@ class TestTradeRecording(unittest.TestCase):
         position = get_position_by_id(pos_id, data_source=self.test_ds)
         self.assertEqual(position['qty'], 600)
         self.assertEqual(position['available_qty'], 400)
+        # update position with a position record that has already been read
+        update_position(pos_id, data_source=self.test_ds, position_record=position, qty_change=-100)
+        position = get_position_by_id(pos_id, data_source=self.test_ds)
+        self.assertEqual(position['qty'], 500)
+        self.assertEqual(position['available_qty'], 400)
+        self.assertEqual(position['symbol'], 'APPL')
+        self.assertEqual(position['position'], 'short')
 
         # update qty and available qty with bad values
         with self.assertRaises(RuntimeError):
@@ -3098,7 +3130,8 @@ class TestTradingUtilFuncs(unittest.TestCase):
         print(symbol_names)
         self.assertEqual(symbol_names, ['平安银行', '万科A', 'N/A', 'N/A'])
 
-        # download func basic data and names will be returned after refresh
+        # download fund basic data, names will be returned even without refresh, because writing
+        # the basic table clears the cached basic data
         print('test get_symbol_names with symbols whose basic data is now downloaded but not refreshed')
 
         fund_basic_df = pd.DataFrame({
@@ -3136,7 +3169,7 @@ class TestTradingUtilFuncs(unittest.TestCase):
                 self.test_ds,
                 ['000001.SZ', '000002.SZ', '000606.OF', '000291.OF']
         )
-        self.assertEqual(symbol_names, ['平安银行', '万科A', 'N/A', 'N/A'])
+        self.assertEqual(symbol_names, ['平安银行', '万科A', '天弘优选', '鹏华普悦'])
         print('after refresh the names are returned')
         symbol_names = get_symbol_names(
                 self.test_ds,
@@ -21,7 +21,7 @@ from qteasy.utilfuncs import next_market_trade_day, unify, list_or_slice, labels
 from qteasy.utilfuncs import weekday_name, nearest_market_trade_day, is_number_like, list_truncate, input_to_list
 from qteasy.utilfuncs import match_ts_code, _lev_ratio, _partial_lev_ratio, _wildcard_match, rolling_window
 from qteasy.utilfuncs import reindent, adjust_string_length, is_float_like, is_integer_like
-from qteasy.utilfuncs import is_cn_stock_symbol_like, is_complete_cn_stock_symbol_like
+from qteasy.utilfuncs import is_cn_stock_symbol_like, is_complete_cn_stock_symbol_like, cached_str_to_list
 
 
 class RetryableError(Exception):
@@ -91,6 +91,16 @@ class TestUtilityFuncs(unittest.TestCase):
         self.assertEqual(str_to_list(''), [])
         self.assertRaises(AssertionError, str_to_list, 123)
 
+    def test_cached_str_to_list(self):
+        self.assertEqual(cached_str_to_list('a, b, c '), ['a', 'b', 'c'])
+        self.assertEqual(cached_str_to_list('a, b: c', sep_char=':'), ['a,b', 'c'])
+        self.assertEqual(cached_str_to_list('a,b', case='upper'), ['A', 'B'])
+        # 修改返回的列表不影响缓存的结果
+        res = cached_str_to_list('000001.SZ, 000002.SZ')
+        res.append('000003.SZ')
+        self.assertEqual(cached_str_to_list('000001.SZ, 000002.SZ'), ['000001.SZ', '000002.SZ'])
+        self.assertRaises(AssertionError, cached_str_to_list, 123)
+
     def test_list_or_slice(self):
         str_dict = {'close': 0, 'open': 1, 'high': 2, 'low': 3}
         self.assertEqual(list_or_slice(slice(1, 2, 1), str_dict), slice(1, 2, 1))
@@ -102,6 +112,9 @@ class TestUtilityFuncs(unittest.TestCase):
         self.assertEqual(list(list_or_slice(0, str_dict)), [0])
         self.assertEqual(list(list_or_slice([0, 2], str_dict)), [0, 2])
         self.assertEqual(list(list_or_slice([True, False, True, False], str_dict)), [0, 2])
+        self.assertEqual(list(list_or_slice(['low', 'close', 'open'], str_dict)), [3, 0, 1])
+        self.assertRaises(KeyError, list_or_slice, ['open', 'volume'], str_dict)
+        self.assertRaises(KeyError, list_or_slice, 'open,volume', str_dict)
 
     def test_labels_to_dict(self):
         target_list = [0, 1, 10, 100]